@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""Synthetic inputs for the benchmarks: COF-like CIF files of a given size and CURATED-COFs CSV files."""
+
+import os
+import csv
+import math
+import tempfile
+import numpy as np
+
+def layered_atoms(natoms):
+    """2D: AA-stacked graphene-like layers (3.4 A apart), two layers in the cell, about natoms atoms."""
+    from ase import Atoms
+    from ase.build import make_supercell
+
+    a, interlayer = 2.46, 3.4
+    cell = [[a, 0, 0], [-a / 2, a * math.sqrt(3) / 2, 0], [0, 0, 2 * interlayer]]
+    frac = [[0, 0, 0], [1 / 3, 2 / 3, 0], [0, 0, 0.5], [1 / 3, 2 / 3, 0.5]]
+    unit = Atoms('C4', scaled_positions=frac, cell=cell, pbc=True)
+    n = max(1, round(math.sqrt(natoms / len(unit))))
+    return make_supercell(unit, np.diag([n, n, 1]))
+
+def bulk_atoms(natoms):
+    """3D: diamond-like framework, about natoms atoms."""
+    from ase.build import bulk, make_supercell
+
+    unit = bulk('C', 'diamond', a=3.57, cubic=True)
+    n = max(1, round((natoms / len(unit)) ** (1 / 3)))
+    return make_supercell(unit, np.diag([n, n, n]))
+
+def cif_text(atoms):
+    """P1 CIF, as found in the Supporting Information."""
+    lines = ["data_synthetic"]
+    lines += ["_cell_{} {:.5f}".format(name, value) for name, value in zip(
+        ['length_a', 'length_b', 'length_c', 'angle_alpha', 'angle_beta', 'angle_gamma'], atoms.cell.cellpar())]
+    lines += ["_symmetry_space_group_name_H-M 'P 1'", "loop_", "_atom_site_label", "_atom_site_type_symbol",
+              "_atom_site_fract_x", "_atom_site_fract_y", "_atom_site_fract_z"]
+    lines += ["{0}{1} {0} {2:.6f} {3:.6f} {4:.6f}".format(s, i, *xyz)
+              for i, (s, xyz) in enumerate(zip(atoms.get_chemical_symbols(), atoms.get_scaled_positions()))]
+    return "\n".join(lines) + "\n"
+
+def coordinates_text(atoms):
+    """Atomic coordinates as pasted in the parse_cif form, with uncertainties and page indexes here and there."""
+    lines = []
+    for i, (s, (x, y, z)) in enumerate(zip(atoms.get_chemical_symbols(), atoms.get_scaled_positions())):
+        suffix = "(3)" if i % 3 == 0 else ""
+        lines.append("{}{} {:.5f}{} {:.5f} {:.5f}".format(s, i, x, suffix, y, z))
+        if i % 50 == 49:
+            lines.append("S{}".format(i // 50)) # page number
+    return "\n".join(lines) + "\n"
+
+def write_tables(folder, nrows):
+    """cof-papers.csv (one paper every 10 frameworks, up to the 10000 IDs available) and cof-frameworks.csv
+    with nrows frameworks, written to new files (as git does), so that all the caches see them as changed.
+    """
+    npapers = min(10000, max(1, nrows // 10))
+    os.makedirs(os.path.join(folder, 'cifs'), exist_ok=True)
+    tables = {
+        'cof-papers.csv': (["CURATED-COFs paper ID", "Reference", "DOI", "Title"],
+                           (["p{:02d}{:02d}".format(i // 100, i % 100), "J. Synth., 2000, 1, 1",
+                             "10.0000/synthetic.{}".format(i), "Synthetic paper {}".format(i)]
+                            for i in range(npapers))),
+        'cof-frameworks.csv': (["CURATED-COFs ID", "Source", "Name", "Elements", "Modifications"],
+                               (["{:02d}{:02d}{}N{}".format(i % npapers // 100, i % npapers % 100, i // npapers,
+                                                             2 + i % 2),
+                                 "SI (CIF)", "COF-{}".format(i), "H,C,N,O",
+                                 "replicated 2x in C direction" if i % 7 == 0 else "none"]
+                                for i in range(nrows))),
+    }
+    for filename, (header, rows) in tables.items():
+        handle, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        with os.fdopen(handle, 'w', newline='') as tmp:
+            writer = csv.writer(tmp, quoting=csv.QUOTE_ALL, lineterminator='\n')
+            writer.writerow(header)
+            writer.writerows(rows)
+        os.replace(tmp_path, os.path.join(folder, filename))
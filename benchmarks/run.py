@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+"""Benchmarks of the ingestion pipeline, on synthetic CIF files (2D and 3D) and CSV tables, offline.
+
+Usage example:
+    python benchmarks/run.py --output results.json              # save the timings
+    python benchmarks/run.py --baseline results.json --quick    # compare with them
+
+The median time of each stage is saved as JSON; with --baseline, the stages slower than the baseline by more than
+--tolerance are listed, and the script exits with a non-zero code.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import datetime
+import tempfile
+import statistics
+from io import StringIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fixtures import layered_atoms, bulk_atoms, cif_text, coordinates_text, write_tables
+
+MIN_SECONDS = 0.005 # differences below this are noise, whatever the ratio
+
+def measure(func, repeats, setup=None):
+    """Median and all the times of func(), calling setup() (not timed) before each run."""
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {'seconds': statistics.median(times), 'repeats': times}
+
+def cif_benchmarks(kind, natoms, args, results):
+    """Stages of the analysis of a CIF file, as in the web form and in the batch script."""
+    from ase.io import read
+    from ase.geometry.dimensionality import analyze_dimensionality
+    from dimensionality import classify_dimensionality
+    from structure import viewer_script
+    from transforms import replicate_cell
+    from coords import parse_coordinates, IncrementalParser
+
+    atoms = layered_atoms(natoms) if kind == '2D' else bulk_atoms(natoms)
+    text = cif_text(atoms)
+    coordinates = coordinates_text(atoms)
+    label = '{}-{}'.format(kind, natoms)
+    print("{}: {} atoms".format(label, len(atoms)))
+
+    stages = {
+        'classify_dimensionality': lambda: classify_dimensionality(atoms),
+        'replicate_cell': lambda: replicate_cell(atoms, (1, 1, 2)),
+        'viewer_script': lambda: viewer_script(atoms),
+        'parse_coordinates': lambda: parse_coordinates(coordinates),
+    }
+    # parse again after editing one line in the middle, as in the parse_cif form
+    parser = IncrementalParser()
+    lines = coordinates.splitlines(keepends=True)
+    edited = ''.join(lines[:len(lines) // 2] + ['X' + lines[len(lines) // 2]] + lines[len(lines) // 2 + 1:])
+    stages['reparse_one_line'] = lambda: parser.parse(edited)
+    setups = {'reparse_one_line': lambda: parser.parse(coordinates)}
+    if len(atoms) <= args.slow_max_atoms:
+        stages['read_cif'] = lambda: read(StringIO(text), format='cif')
+        stages['analyze_dimensionality'] = lambda: analyze_dimensionality(atoms, method='RDA')
+    try:
+        import manage_crystal.utils # pylint: disable=unused-import
+        from pipeline import format_cif
+        stages['manage_crystal_format'] = lambda: format_cif(atoms)
+    except ImportError:
+        print("  manage_crystal not installed: skipping its stage")
+
+    for stage, func in stages.items():
+        results['{}/{}'.format(stage, label)] = dict(measure(func, args.repeats, setups.get(stage)), natoms=len(atoms))
+        print("  {:<25} {:.4f} s".format(stage, results['{}/{}'.format(stage, label)]['seconds']))
+
+def table_benchmarks(folder, nrows, args, results):
+    """Minting of the IDs with tables of nrows frameworks: first load, then lookups and appends."""
+    from data import FRAMEWORKS_FILE
+    from ids import ID_INDEX, mint_paper_id, mint_cof_id
+
+    label = 'rows-{}'.format(nrows)
+    print("{}: writing the tables".format(label))
+    write_tables(folder, nrows)
+    counter = iter(range(10**9))
+
+    def rewrite():
+        write_tables(folder, nrows) # new files: everything is loaded again
+        ID_INDEX.reset()
+
+    def append():
+        with ID_INDEX.transaction(FRAMEWORKS_FILE) as rows:
+            cof_id = ID_INDEX.mint_cof_id('p0001', 'N', '2', reserve=True)
+            rows.append([cof_id, 'SI (CIF)', 'COF-new', 'C', 'none'])
+
+    stages = { # the index is loaded by the cold stage, for the next ones
+        'load_tables': (ID_INDEX.update, rewrite),
+        'mint_paper_id': (lambda: mint_paper_id('10.0000/new.{}'.format(next(counter)), '2000'), None),
+        'mint_cof_id': (lambda: mint_cof_id('p0001', 'N', '2'), None),
+        'append_framework': (append, None),
+    }
+    for stage, (func, setup) in stages.items():
+        results['{}/{}'.format(stage, label)] = dict(measure(func, args.repeats, setup), nrows=nrows)
+        print("  {:<25} {:.4f} s".format(stage, results['{}/{}'.format(stage, label)]['seconds']))
+
+def compare(results, baseline, tolerance):
+    """Return the stages slower than the baseline, as (name, seconds, baseline seconds)."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        now, before = result['seconds'], baseline[name]['seconds']
+        flag = now > before * (1 + tolerance) and now - before > MIN_SECONDS
+        print("{:<45} {:>9.4f} s {:>9.4f} s {:>7.2f}x{}".format(
+            name, now, before, now / before if before else float('inf'), "  REGRESSION" if flag else ""))
+        if flag:
+            regressions.append((name, now, before))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000, 50000], help='atoms of the CIFs')
+    parser.add_argument('--kinds', nargs='+', choices=['2D', '3D'], default=['2D', '3D'])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000], help='rows of the tables')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--slow-max-atoms', type=int, default=2000,
+                        help='run the CIF reader and the full RDA of ASE (quadratic) only up to this size')
+    parser.add_argument('--quick', action='store_true', help='only the smallest sizes, once: for a quick check')
+    parser.add_argument('--output', default=None, help='JSON file for the results')
+    parser.add_argument('--baseline', default=None, help='JSON file with the results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='relative slowdown allowed (default: 25%%)')
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.sizes, args.rows, args.repeats = args.sizes[:1], args.rows[:1], 1
+
+    # the modules read the folders at import: use temporary ones, not to touch the real data and caches
+    folder = tempfile.mkdtemp(prefix='cofdb_benchmarks_')
+    os.environ['CURATED_COFS'] = os.path.join(folder, 'CURATED-COFs')
+    os.environ['COFDB_CACHE'] = os.path.join(folder, 'cache')
+    sys.path.insert(0, os.path.join(ROOT, 'parse_cif'))
+    sys.path.insert(0, os.path.join(ROOT, 'cofdb_submit'))
+
+    results = {}
+    try:
+        for natoms in args.sizes:
+            for kind in args.kinds:
+                cif_benchmarks(kind, natoms, args, results)
+        for nrows in args.rows:
+            table_benchmarks(os.environ['CURATED_COFS'], nrows, args, results)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    import ase
+    report = {
+        'meta': {
+            'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'ase': ase.__version__,
+            'machine': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(report, handle, indent=2)
+        print("Results saved in {}".format(args.output))
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        print("\nComparison with {} ({})".format(args.baseline, baseline['meta']['date']))
+        regressions = compare(results, baseline['results'], args.tolerance)
+        if regressions:
+            print("{} stages slower than the baseline by more than {:.0%}.".format(len(regressions), args.tolerance))
+            return 1
+        print("No regressions.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""On-disk cache of the analysis of the CIF files, to parse again the same file instantly."""
+
+import os
+import pickle
+import hashlib
+import tempfile
+from data import CACHE_FOLDER
+
+CHUNK_BYTES = 1024**2 # to hash large files
+
+class AnalysisCache():
+    """Pickled results in a folder, keyed by the hash of the CIF content and of the options.
+    The modification time of a file is updated at every hit, and the least recently used files are
+    deleted when the folder exceeds max_bytes.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(content, *options):
+        """Key for the CIF content (bytes, or the path of the file, read in chunks) and the options
+        (e.g., relabel, replication, versions).
+        """
+        sha = hashlib.sha256()
+        if isinstance(content, os.PathLike):
+            with open(content, 'rb') as handle:
+                for chunk in iter(lambda: handle.read(CHUNK_BYTES), b''):
+                    sha.update(chunk)
+        else:
+            sha.update(content)
+        sha.update(repr(options).encode())
+        return sha.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key + '.pkl')
+
+    def get(self, key):
+        """Return the cached result, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as handle:
+                result = pickle.load(handle)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        return result
+
+    def set(self, key, result):
+        os.makedirs(self.folder, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=self.folder, suffix='.tmp')
+        with os.fdopen(handle, 'wb') as tmp:
+            pickle.dump(result, tmp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key)) # atomic: other processes never read half files
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used results until the cache fits in max_bytes."""
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith('.pkl'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError: # deleted by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+ANALYSIS_CACHE = AnalysisCache(os.path.join(CACHE_FOLDER, 'analysis'),
+                               max_bytes=int(float(os.environ.get('COFDB_CACHE_MB', 500)) * 1024**2))
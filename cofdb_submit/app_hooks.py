@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+"""Bokeh server lifecycle hooks of cofdb_submit: load the tables, start the workers and update the index of the
+fingerprints once, before the first sessions arrive.
+"""
+
+import os
+import threading
+from jobs import JOBS
+from snapshot import get_modifications_options
+from ids import ID_INDEX
+from fingerprints import FINGERPRINTS
+
+def warm_up():
+    """Import ASE, manage_crystal and crossref, load the snapshot of the tables and the ID index, start the workers
+    (importing the pipeline) and the update of the fingerprints in one of them.
+    """
+    try:
+        import ase.io.cif, ase.build, ase.geometry.dimensionality # pylint: disable=unused-import
+        import manage_crystal.utils, crossref.restful # pylint: disable=unused-import
+        get_modifications_options()
+        ID_INDEX.update()
+        JOBS.start(['pipeline', 'preview', 'ase.io.cif']) # the workers import the modules meanwhile
+        FINGERPRINTS.update_in_background() # in a worker
+    except Exception as exc: # pylint: disable=broad-except
+        print("WARNING: warm up failed ({}), sessions will load everything when needed.".format(exc))
+        return
+    print("Warm up done.")
+
+def on_server_loaded(server_context):
+    """Warm up in a thread, to start serving immediately: disable it with COFDB_WARMUP=0."""
+    if os.environ.get('COFDB_WARMUP', '1') != '0':
+        threading.Thread(target=warm_up, daemon=True).start()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""Check all the CIF files of the cifs/ folder against cof-frameworks.csv: elements, dimensionality (the 2/3
+at the end of the ID), orientation of the layers of 2D COFs, and manage_crystal formatting.
+
+Usage example:
+    python cofdb_submit/audit.py --report audit.json
+
+The analysis of each file is cached by the hash of its content, so that running it again only analyzes
+the files added or modified. The script exits with a non-zero code if some file does not pass the checks.
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+
+from data import FRAMEWORKS_FILE, CIFS_FOLDER, CACHE_FOLDER
+from snapshot import SNAPSHOT
+from parallel import imap_ordered
+from analysis_cache import CHUNK_BYTES
+
+AUDIT_FILE = os.path.join(CACHE_FOLDER, 'audit.json')
+AUDIT_VERSION = 1 # increase when the results of inspect_file change, to invalidate the cache
+
+def content_hash(path):
+    """SHA-256 of the file, read in chunks."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(CHUNK_BYTES), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def formatted_cif(path):
+    """Content of the CIF file with the standard formatting of manage_crystal."""
+    from manage_crystal.utils import parse_and_write
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        out_path = os.path.join(tmpdir, 'crystal.cif')
+        parse_and_write(path, out_path)
+        with open(out_path) as handle:
+            return handle.read()
+
+def inspect_file(path, fix=False):
+    """Everything needed for the checks that depends only on the content of the CIF file (done in the workers).
+    With fix, a file not in the standard formatting is rewritten with it.
+    """
+    from ase.io import read
+    from dimensionality import classify_dimensionality
+
+    atoms = read(path, format='cif')
+    formula = atoms.get_chemical_formula()
+    classification = classify_dimensionality(atoms)
+    with open(path) as handle:
+        content = handle.read()
+    formatted = formatted_cif(path)
+    result = {
+        'natoms': len(atoms),
+        'elements': ",".join(e for e in re.split(r'\d+', formula) if e), # as in parse_cif
+        'dimtype': classification['dimtype'],
+        'normal': classification['normal'],
+        'method': classification['method'],
+        'formatted': formatted == content,
+        'reformatted': False,
+    }
+    if fix and not result['formatted']:
+        handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(handle, 'w') as tmp:
+            tmp.write(formatted)
+        os.replace(tmp_path, path)
+        result['reformatted'] = True
+    return result
+
+FORCED_2D = 'replicated 2x in C direction' # modifications of the frameworks forced to 2D (as by parse_cif)
+
+def check(cof_id, row, inspected):
+    """Problems of the framework, comparing the analysis of its CIF file with its row of cof-frameworks.csv,
+    and warnings that are not counted as failures.
+    """
+    problems, warnings = [], []
+    if row is None:
+        problems.append("not in cof-frameworks.csv")
+    elif set(row['elements'].split(',')) != set(inspected['elements'].split(',')):
+        problems.append("elements: {} in cof-frameworks.csv, {} in the CIF".format(
+            row['elements'], inspected['elements']))
+    dimensionality = '2' if inspected['dimtype'] == '2D' else '3' # as in parse_cif
+    if cof_id[-1] == '2' and dimensionality == '3' and row and row['modifications'] == FORCED_2D:
+        # layers close by, forced to 2D with "Force to replicate 2x": the 2D in the ID is intended
+        warnings.append("dimensionality: forced to 2D, {} detected ({} analysis)".format(
+            inspected['dimtype'], inspected['method']))
+    elif cof_id[-1] != dimensionality:
+        problems.append("dimensionality: {}D in the ID, {} detected ({} analysis, modifications: {})".format(
+            cof_id[-1], inspected['dimtype'], inspected['method'], row['modifications'] if row else None))
+    elif dimensionality == '2' and inspected['method'] == 'fast' and inspected['normal'] != 2:
+        problems.append("orientation: the layers are not on the XY plane")
+    if not inspected['formatted'] and not inspected['reformatted']:
+        problems.append("formatting: not the standard formatting of manage_crystal (use --fix)")
+    return problems, warnings
+
+def load_cache():
+    try:
+        with open(AUDIT_FILE) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache):
+    os.makedirs(os.path.dirname(AUDIT_FILE), exist_ok=True)
+    handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(AUDIT_FILE), suffix='.tmp')
+    with os.fdopen(handle, 'w') as tmp:
+        json.dump(cache, tmp)
+    os.replace(tmp_path, AUDIT_FILE)
+
+def main(argv=None):
+    import ase
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fix', action='store_true', help='rewrite the files not in the standard formatting')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: all cores)')
+    parser.add_argument('--timeout', type=float, default=None, help='max seconds of processing for each CIF')
+    parser.add_argument('--report', default=None, help='JSON file for the report (default: stdout)')
+    args = parser.parse_args(argv)
+
+    rows = {cof_id: {'elements': elements, 'modifications': modifications} for cof_id, elements, modifications
+            in SNAPSHOT.rows(FRAMEWORKS_FILE, ['cof_id', 'elements', 'modifications'])}
+    filenames = sorted(f for f in os.listdir(CIFS_FOLDER) if f.endswith('.cif'))
+    version = [AUDIT_VERSION, ase.__version__] # results of other versions are analyzed again
+    cached = load_cache()
+    digests = {filename: content_hash(os.path.join(CIFS_FOLDER, filename)) for filename in filenames}
+    cache, todo = {}, []
+    for filename, digest in digests.items():
+        entry = cached.get(digest)
+        if entry is not None and entry['version'] == version and (entry['result']['formatted'] or not args.fix):
+            cache[digest] = entry
+        else:
+            todo.append((filename, digest))
+    print("Checking {} CIF files ({} to analyze)...".format(len(filenames), len(todo)))
+
+    inspected, errors = {}, {}
+    tasks = ((os.path.join(CIFS_FOLDER, filename), args.fix) for filename, _ in todo)
+    for (filename, digest), (_, result, error) in zip(todo, imap_ordered(inspect_file, tasks, args.workers,
+                                                                           args.timeout)):
+        if error is not None:
+            errors[filename] = "{}: {}".format(type(error).__name__, error)
+            continue
+        inspected[filename] = result
+        if not result['reformatted']: # otherwise the content changed: analyzed again at the next run
+            cache[digest] = {'version': version, 'result': result}
+    for filename in filenames:
+        if filename not in inspected and filename not in errors:
+            inspected[filename] = cache[digests[filename]]['result']
+    save_cache(cache) # only the files present now: the cache does not grow with the deleted ones
+
+    frameworks = []
+    for filename in filenames:
+        cof_id = os.path.splitext(filename)[0]
+        if filename in errors:
+            problems, warnings = ["error: " + errors[filename]], []
+        else:
+            problems, warnings = check(cof_id, rows.get(cof_id), inspected[filename])
+        if problems or warnings or inspected.get(filename, {}).get('reformatted'):
+            frameworks.append({'cof_id': cof_id, 'file': filename, 'problems': problems, 'warnings': warnings,
+                               'reformatted': inspected.get(filename, {}).get('reformatted', False)})
+    missing = sorted(set(rows) - {os.path.splitext(f)[0] for f in filenames})
+    nfailed = sum(bool(entry['problems']) for entry in frameworks)
+    report = {
+        'folder': CIFS_FOLDER,
+        'total': len(filenames),
+        'analyzed': len(todo),
+        'failed': nfailed,
+        'warnings': sum(bool(entry['warnings']) for entry in frameworks), # not counted as failed
+        'reformatted': sum(entry['reformatted'] for entry in frameworks),
+        'missing_files': missing, # in cof-frameworks.csv, without CIF file
+        'frameworks': frameworks, # only the ones with problems or warnings (or reformatted)
+    }
+    if args.report:
+        with open(args.report, 'w') as handle:
+            json.dump(report, handle, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    print("{} of {} CIF files with problems, {} frameworks without CIF file.".format(
+        nfailed, len(filenames), len(missing)))
+    return 1 if nfailed or missing else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
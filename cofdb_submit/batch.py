@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+"""Add all the CIF files of a folder (or tarball) to the CURATED-COFs database, without the web form.
+
+Usage example:
+    python cofdb_submit/batch.py path/to/cifs/ --paper-id p2101 --report report.json
+"""
+
+import os
+import sys
+import json
+import argparse
+import shutil
+import tarfile
+import tempfile
+import itertools
+from pathlib import Path
+
+from data import FRAMEWORKS_FILE
+from ids import ID_INDEX, mint_cof_id
+from pipeline import process_cif, framework_row, CifFiles
+from parallel import imap_ordered
+
+def iter_cifs(path, tmpdir):
+    """Yield (filename, path) for each CIF in the folder or tarball: the files of a tarball are extracted
+    one at a time to tmpdir, so that the workers read them from disk (and not from memory, copied through a pipe).
+    """
+    if os.path.isdir(path):
+        for filename in sorted(os.listdir(path)):
+            if filename.lower().endswith('.cif'):
+                yield filename, Path(path, filename)
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path, 'r:*') as tar:
+            for index, member in enumerate(tar):
+                if member.isfile() and member.name.lower().endswith('.cif'):
+                    filename = os.path.basename(member.name)
+                    extracted = Path(tmpdir, '{}-{}'.format(index, filename)) # the names may be repeated
+                    with tar.extractfile(member) as source, open(extracted, 'wb') as target:
+                        shutil.copyfileobj(source, target)
+                    yield filename, extracted
+    else:
+        raise ValueError("ERROR: {} is neither a folder nor a tarball.".format(path))
+
+def process_task(filename, cif_path, relabel, replicate):
+    """Work done in the worker processes."""
+    return process_cif(cif_path, relabel=relabel, replicate=replicate)
+
+def add(filename, result, error, args, files, rows):
+    """Mint and write a single processed framework (in the main process, to keep the IDs deterministic),
+    appending its row to the rows of the transaction: return its entry for the report.
+    The ID is reserved only once its CIF file is written, so that a failure does not leave a gap.
+    """
+    entry = {'file': filename, 'status': 'failed', 'cof_id': None, 'error': None}
+    try:
+        if error is not None:
+            raise error
+        if result['dimensionality'].startswith('ERROR'):
+            raise ValueError(result['dimensionality'])
+        info = {
+            'cof_id': mint_cof_id(args.paper_id, args.charge, result['dimensionality'][0]),
+            'paper_id': args.paper_id,
+            'source': args.source,
+            'name': os.path.splitext(filename)[0],
+            'dimensionality': result['dimensionality'],
+            'elements': result['elements'],
+            'modifications': result['modifications'],
+            'charge': args.charge,
+        }
+        files.write(info['cof_id'], result['cif'])
+        ID_INDEX.add_framework(info['cof_id'], args.paper_id)
+        rows.append(framework_row(info))
+    except Exception as exc: # pylint: disable=broad-except
+        entry['error'] = "{}: {}".format(type(exc).__name__, exc)
+        return entry
+    entry.update(status='added', cof_id=info['cof_id'], dimensionality=info['dimensionality'],
+                 elements=info['elements'], modifications=info['modifications'], natoms=result['natoms'],
+                 relabel=result['relabel'])
+    return entry
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='folder or tarball containing the CIF files')
+    parser.add_argument('--paper-id', required=True, help='CURATED-COFs paper ID, e.g., p2101')
+    parser.add_argument('--charge', choices=['N', 'C'], default='N', help='N: neutral, C: charged')
+    parser.add_argument('--source', default='SI (CIF)', help='CIF source, as in the web form')
+    parser.add_argument('--relabel', choices=['cab', 'bca'], default=None,
+                        help='relabel cell vectors abc (default: automatic for the layers of 2D COFs)')
+    parser.add_argument('--replicate', action='store_true', help='force to replicate 2x in C direction')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes (default: all cores)')
+    parser.add_argument('--timeout', type=float, default=None, help='max seconds of processing for each CIF')
+    parser.add_argument('--commit-every', type=int, default=50, help='rows written at once to the CSV file')
+    parser.add_argument('--report', default=None, help='JSON file for the summary report (default: stdout)')
+    args = parser.parse_args(argv)
+
+    if not ID_INDEX.has_paper(args.paper_id):
+        parser.error("paper ID {} not found in cof-papers.csv: add the paper first.".format(args.paper_id))
+
+    entries = []
+    with tempfile.TemporaryDirectory(prefix='cofdb_batch_') as tmpdir:
+        tasks = ((filename, cif_path, args.relabel, args.replicate)
+                 for filename, cif_path in iter_cifs(args.path, tmpdir))
+        results = imap_ordered(process_task, tasks, args.workers, args.timeout)
+        while True: # commit the rows to cof-frameworks.csv every few frameworks, locking it only meanwhile
+            chunk = list(itertools.islice(results, args.commit_every))
+            if not chunk:
+                break
+            with CifFiles() as files, ID_INDEX.transaction(FRAMEWORKS_FILE) as rows: # files moved after the commit
+                for (filename, cif_path, *_), result, error in chunk:
+                    entry = add(filename, result, error, args, files, rows)
+                    print("{}: {} {}".format(entry['file'], entry['status'], entry['cof_id'] or entry['error']))
+                    entries.append(entry)
+                    if cif_path.parent == Path(tmpdir): # extracted from the tarball: not needed anymore
+                        cif_path.unlink()
+
+    nfailed = sum(entry['status'] == 'failed' for entry in entries)
+    report = {
+        'paper_id': args.paper_id,
+        'total': len(entries),
+        'added': len(entries) - nfailed,
+        'failed': nfailed,
+        'frameworks': entries,
+    }
+    if args.report:
+        with open(args.report, 'w') as handle:
+            json.dump(report, handle, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    print("Added {} of {} CIF files ({} failed).".format(report['added'], report['total'], nfailed))
+    return 1 if nfailed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
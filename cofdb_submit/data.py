@@ -2,8 +2,79 @@
 """Load data files: cof-papers.csv and cof-frameworks.csv."""
 
 import os
+import csv
+import threading
+import contextlib
+from io import StringIO
+try:
+    import fcntl
+except ImportError: # Windows: lock only between the threads of this process
+    fcntl = None
 
 CURATED_COFS=os.environ.get('CURATED_COFS', os.path.abspath('./CURATED-COFs'))
 PAPERS_FILE = os.path.join(CURATED_COFS, 'cof-papers.csv')
 FRAMEWORKS_FILE = os.path.join(CURATED_COFS, 'cof-frameworks.csv')
-CIFS_FOLDER = os.path.join(CURATED_COFS, 'cifs')
\ No newline at end of file
+CIFS_FOLDER = os.path.join(CURATED_COFS, 'cifs')
+CACHE_FOLDER = os.environ.get('COFDB_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'cofdb_submit'))
+
+_THREAD_LOCK = threading.RLock()
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive (advisory) lock on the file, between processes and threads: do not nest it for the same file.
+    The file must exist: it is not created (e.g., a table without its header).
+    """
+    with _THREAD_LOCK:
+        try:
+            descriptor = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            raise FileNotFoundError("ERROR: {} not found... check the README!".format(path))
+        try:
+            if fcntl is not None:
+                fcntl.flock(descriptor, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(descriptor) # releases the lock
+
+class TableWriter():
+    """Writer of the CSV tables, shared by all the Bokeh sessions: rows are appended under a lock, also against
+    other processes. The app and the scripts read the tables from their snapshot (see snapshot.py).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+    @contextlib.contextmanager
+    def transaction(self, path):
+        """Lock the table (also for other processes) and yield a list for the new rows (lists of values,
+        in columns order): they are appended all at once when the block exits without errors.
+        Nobody else can append meanwhile, so the IDs can be minted inside the block.
+        """
+        with self._lock, file_lock(path):
+            rows = []
+            yield rows
+            if rows:
+                self._write(path, rows)
+
+    def append(self, path, rows):
+        """Append the rows to the table, in a transaction."""
+        with self.transaction(path) as new_rows:
+            new_rows.extend(rows)
+
+    @staticmethod
+    def _write(path, rows):
+        """Write the rows with proper CSV quoting."""
+        text = StringIO()
+        csv.writer(text, quoting=csv.QUOTE_ALL, lineterminator='\n').writerows(rows)
+        with open(path, 'rb') as handle: # do not append to the last line if it misses the newline
+            handle.seek(0, os.SEEK_END)
+            if handle.tell() > 0:
+                handle.seek(-1, os.SEEK_END)
+                if handle.read(1) != b'\n':
+                    text = StringIO('\n' + text.getvalue())
+        with open(path, 'a', newline='') as handle:
+            handle.write(text.getvalue())
+            handle.flush()
+            os.fsync(handle.fileno())
+
+TABLES = TableWriter()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""Fast classification of the dimensionality of a framework (2D vs 3D), and of the orientation of its layers.
+
+The bonds are found once with a neighbor list, at the largest bonding scale, and the dimensionality of each bonded
+component is the rank of the lattice translations that connect an atom to its own periodic images.
+The full RDA analysis of ASE is used only if the result depends on the bonding scale.
+"""
+
+import numpy as np
+
+K_LOW, K_HIGH = 1.15, 1.35 # scale factors of the covalent radii to define a bond
+
+# Relabel of the cell vectors that brings the layers on the ab plane, for the axis normal to them
+RELABEL_FOR_NORMAL = {0: 'bca', 1: 'cab', 2: None}
+
+def _bonds(atoms, k):
+    """Bonds at the largest scale k, once: (i, j, S, d/(ri + rj)) to select them also at smaller scales."""
+    from ase.data import covalent_radii
+    from ase.neighborlist import neighbor_list
+
+    radii = covalent_radii[atoms.numbers]
+    i, j, S, d = neighbor_list('ijSd', atoms, k * radii)
+    return i, j, S, d / (radii[i] + radii[j])
+
+def _components(natoms, i, j, S):
+    """Bonded components: return (labels of the atoms, list of (rank, normal) for each component),
+    where normal is the (integer) lattice direction normal to the translations of a 2D component.
+    """
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components, breadth_first_order
+
+    graph = coo_matrix((np.ones(len(i)), (i, j)), shape=(natoms, natoms)).tocsr()
+    ncomp, labels = connected_components(graph, directed=False)
+
+    # lookup of the image of the first bond found between each pair of atoms
+    keys = i.astype(np.int64) * natoms + j
+    sort = np.argsort(keys, kind='stable')
+    sorted_keys = keys[sort]
+
+    # offset of each atom in a spanning tree of its component, so that all the bonds of the tree are unwrapped:
+    # one search for all the components, from a virtual atom bonded to the first atom of each component
+    roots = np.unique(labels, return_index=True)[1]
+    tree = coo_matrix((np.ones(len(i) + ncomp), (np.append(i, np.full(ncomp, natoms)), np.append(j, roots))),
+                      shape=(natoms + 1, natoms + 1)).tocsr()
+    order, pred = breadth_first_order(tree, natoms, directed=False)
+    children = order[1:]
+    parents = pred[children]
+    shifts = np.zeros((len(children), 3), dtype=int)
+    bonded = parents != natoms
+    shifts[bonded] = S[sort[np.searchsorted(sorted_keys, parents[bonded].astype(np.int64) * natoms + children[bonded])]]
+    offsets = np.zeros((natoms + 1, 3), dtype=int)
+    for node, parent, shift in zip(children.tolist(), parents.tolist(), shifts): # parents come first
+        offsets[node] = offsets[parent] + shift
+
+    # every bond that is not unwrapped by the tree closes a loop through a lattice translation
+    cycles = offsets[i] + S - offsets[j]
+    loops = cycles.any(axis=1)
+    found = np.unique(np.column_stack([labels[i[loops]], cycles[loops]]), axis=0) # sorted by component
+    results = [(0, None)] * ncomp
+    for vectors in np.split(found, np.flatnonzero(np.diff(found[:, 0])) + 1):
+        if len(vectors) == 0:
+            continue
+        comp, vectors = vectors[0, 0], vectors[:, 1:]
+        rank = np.linalg.matrix_rank(vectors)
+        normal = None
+        if rank == 2:
+            for v in vectors[1:]:
+                cross = np.cross(vectors[0], v)
+                if cross.any():
+                    normal = cross // np.gcd.reduce(cross)
+                    break
+        results[comp] = (rank, normal)
+        if rank == 3:
+            break # early exit: the framework is 3D anyway
+    return labels, results
+
+def _dimtype(results):
+    """Same notation of ASE, e.g., '2D' or '0D2D'."""
+    return ''.join('{}D'.format(d) for d in sorted({rank for rank, _ in results}))
+
+def classify_dimensionality(atoms):
+    """Classify the framework: return a dictionary with
+    'dimtype' (as in ASE, e.g., '2D' or '3D'), 'method' ('fast' or 'RDA'), 'intervals' (only for RDA),
+    'normal' (axis 0/1/2 normal to the layers of a 2D framework, or None if oblique/unknown),
+    'relabel' (relabel of the cell vectors to have the layers on the ab plane, or None).
+    """
+    result = {'dimtype': None, 'method': 'fast', 'intervals': None, 'normal': None, 'relabel': None}
+
+    i, j, S, scale = _bonds(atoms, K_HIGH)
+    low_bonds = scale < K_LOW
+    _, low = _components(len(atoms), i[low_bonds], j[low_bonds], S[low_bonds])
+    if any(rank == 3 for rank, _ in low): # more bonds can only increase the dimensionality
+        result['dimtype'] = '3D'
+        return result
+    _, high = _components(len(atoms), i, j, S)
+
+    if _dimtype(low) != _dimtype(high): # ambiguous: rely on the full analysis
+        from ase.geometry.dimensionality import analyze_dimensionality
+        intervals = analyze_dimensionality(atoms, method='RDA')
+        result.update(dimtype=intervals[0].dimtype, method='RDA', intervals=intervals)
+        return result
+
+    result['dimtype'] = _dimtype(high)
+    normals = {tuple(abs(normal)) for rank, normal in high if rank == 2}
+    if result['dimtype'] == '2D' and len(normals) == 1:
+        normal = np.array(normals.pop())
+        if np.count_nonzero(normal) == 1: # layers parallel to two cell vectors
+            result['normal'] = int(np.flatnonzero(normal)[0])
+            result['relabel'] = RELABEL_FOR_NORMAL[result['normal']]
+    return result
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""Get the metadata of a publication from its DOI, using the Crossref API and a persistent cache."""
+
+import os
+import json
+import time
+import sqlite3
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from data import CACHE_FOLDER
+
+CROSSREF_API = os.environ.get('CROSSREF_API') # e.g., http://localhost:8000 to use a local fixture server
+DOI_CACHE_FILE = os.path.join(CACHE_FOLDER, 'doi_metadata.sqlite')
+DOI_CACHE_TTL = float(os.environ.get('COFDB_DOI_TTL_DAYS', 30)) * 24 * 3600
+METADATA_FIELDS = ('title', 'short-container-title', 'volume', 'page', 'published-print', 'created') # see paper_info
+
+def normalize_doi(doi):
+    """If Angewandte German Edition, change with International Edition."""
+    return doi.strip().replace("ange","anie")
+
+def query_crossref(doi):
+    """Query the Crossref API for the DOI: return the metadata dictionary, or None if not found."""
+    if CROSSREF_API:
+        from urllib.request import urlopen
+        from urllib.error import HTTPError
+        from urllib.parse import quote
+        try:
+            with urlopen("{}/works/{}".format(CROSSREF_API.rstrip('/'), quote(doi)), timeout=30) as response:
+                return json.load(response)['message']
+        except HTTPError as exc:
+            if exc.code == 404:
+                return None
+            raise
+    from crossref.restful import Works
+    return Works().doi(doi)
+
+class DoiCache():
+    """DOI -> metadata, in a SQLite file shared by all the processes: entries older than ttl seconds are queried
+    again. Only the fields read by paper_info are stored, one row per DOI. DOIs not found are not cached,
+    since they may be registered later.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            with self._connection:
+                self._connection.execute(
+                    "CREATE TABLE IF NOT EXISTS dois (doi TEXT PRIMARY KEY, time REAL, metadata TEXT)")
+        return self._connection
+
+    def get(self, doi):
+        with self._lock:
+            entry = self._connect().execute("SELECT time, metadata FROM dois WHERE doi = ?", (doi,)).fetchone()
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return json.loads(entry[1])
+
+    def set(self, doi, metadata):
+        metadata = {key: value for key, value in metadata.items() if key in METADATA_FIELDS}
+        with self._lock, self._connect() as db: # commits the single upsert
+            db.execute("INSERT OR REPLACE INTO dois (doi, time, metadata) VALUES (?, ?, ?)",
+                       (doi, time.time(), json.dumps(metadata)))
+
+DOI_CACHE = DoiCache(DOI_CACHE_FILE, DOI_CACHE_TTL)
+
+def fetch_metadata(doi, query=query_crossref):
+    """Metadata for the DOI, from the cache or from Crossref (query can be replaced, e.g., for testing)."""
+    metadata = DOI_CACHE.get(doi)
+    if metadata is None:
+        print("Querying Crossref API for doi {} (this can take several seconds, depending on the server...)".format(doi))
+        metadata = query(doi)
+        print("Query done!")
+        if metadata:
+            DOI_CACHE.set(doi, metadata)
+    return metadata
+
+EXECUTOR = ThreadPoolExecutor(max_workers=4) # shared by all the sessions: the queries wait on the network
+
+def fetch_metadata_async(doi):
+    """Run fetch_metadata in a thread, not to block the Bokeh server: return a Future."""
+    return EXECUTOR.submit(fetch_metadata, doi)
+
+def paper_info(metadata):
+    """Title, year and reference of the paper from the Crossref metadata."""
+    journal = str(metadata['short-container-title'][0])
+
+    if 'volume' in metadata:
+        already_in_issue = True
+        volume = metadata['volume']
+        if 'published-print' in metadata: # ACS, wiley
+            year = str(metadata['published-print']['date-parts'][0][0])
+        elif 'created' in metadata: # RSC
+            year = str(metadata['created']['date-parts'][0][0])
+        else:
+            year = 'ERROR: year not found.'
+    else: # not yet in an issue: assuming that it will be published at the same year of today
+        already_in_issue = False
+        year = str(datetime.datetime.now().year)
+
+    if already_in_issue:
+        if 'page' in metadata: # most of the journals
+            reference = "{}, {}, {}, {}".format(journal, year, volume, metadata['page'])
+        else:  # NatComm or not yet in an issue
+            reference = "{}, {}, {}".format(journal, year, volume)
+    else:
+        reference = "{}, {}, {}".format(journal, year, "in press")
+
+    return {'title': str(metadata['title'][0]), 'year': year, 'reference': reference}
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""Index of structure fingerprints of the CIF files in the cifs/ folder, to warn about near-duplicates.
+
+To build (or update) the index in parallel from the command line:
+    python cofdb_submit/fingerprints.py
+"""
+
+import os
+import json
+import math
+import tempfile
+import itertools
+import threading
+from functools import reduce
+import numpy as np
+
+from data import CIFS_FOLDER, CACHE_FOLDER
+from parallel import imap_ordered
+
+FINGERPRINTS_FILE = os.path.join(CACHE_FOLDER, 'fingerprints.json')
+RDF_CUTOFF = 4.0 # Angstrom
+RDF_BINS = 40
+VOLUME_TOL = 0.03 # relative difference of the volume per atom
+RDF_TOL = 0.1     # L1 distance of the normalized radial distributions
+CELL_TOL = 0.03   # relative difference of the lengths of the reduced cells
+CELL_MAX_MULTIPLE = 4 # a cell is compared also with the supercells up to 4x along each vector
+
+def fingerprint(atoms):
+    """Cheap fingerprint, comparable across the choices of the cell (e.g., replicated 2x, see similarity):
+    reduced composition, volume per atom, reduced (Niggli) cell parameters and per-atom radial distribution.
+    """
+    from ase.neighborlist import neighbor_list
+
+    symbols, counts = np.unique(atoms.get_chemical_symbols(), return_counts=True)
+    gcd = reduce(math.gcd, counts.tolist())
+    formula = ''.join('{}{}'.format(s, c // gcd) for s, c in zip(symbols, counts))
+    cell, _ = atoms.cell.niggli_reduce()
+    distances = neighbor_list('d', atoms, RDF_CUTOFF)
+    rdf, _ = np.histogram(distances, bins=RDF_BINS, range=(0, RDF_CUTOFF))
+    return {
+        'formula': formula,
+        'volume_per_atom': atoms.get_volume() / len(atoms),
+        'cell': [round(x, 3) for x in cell.cellpar()],
+        'rdf': (rdf / len(atoms)).round(4).tolist(),
+    }
+
+def fingerprint_file(path):
+    from ase.io import read
+    return fingerprint(read(path, format='cif'))
+
+def cell_distance(cell1, cell2):
+    """Largest relative difference of the lengths of the reduced cells, matching each length of a cell with
+    a length of the other or a multiple of it (e.g., the c of a COF replicated 2x), in the best order.
+    """
+    best = math.inf
+    for lengths in itertools.permutations(cell2[:3]):
+        distance = 0
+        for length1, length2 in zip(cell1[:3], lengths):
+            short, long = sorted((length1, length2))
+            multiple = min(max(round(long / short), 1), CELL_MAX_MULTIPLE)
+            distance = max(distance, abs(long / (multiple * short) - 1))
+        best = min(best, distance)
+    return best
+
+def similarity(fp1, fp2):
+    """None if different structures, otherwise the L1 distance of the radial distributions plus the distance
+    of the reduced cells.
+    """
+    if fp1['formula'] != fp2['formula']:
+        return None
+    vpa1, vpa2 = fp1['volume_per_atom'], fp2['volume_per_atom']
+    if abs(vpa1 - vpa2) > VOLUME_TOL * max(vpa1, vpa2):
+        return None
+    cell = cell_distance(fp1['cell'], fp2['cell'])
+    if cell > CELL_TOL:
+        return None
+    rdf1, rdf2 = np.array(fp1['rdf']), np.array(fp2['rdf'])
+    distance = np.abs(rdf1 - rdf2).sum() / max(rdf1.sum(), rdf2.sum(), 1e-9)
+    return distance + cell if distance <= RDF_TOL else None
+
+def update_index():
+    """Update the saved index of FINGERPRINTS (e.g., in a worker process): return the number of files in it."""
+    FINGERPRINTS.update()
+    return len(FINGERPRINTS)
+
+def _serial(args):
+    """Same results as imap_ordered, in this process."""
+    try:
+        return args, fingerprint_file(*args), None
+    except Exception as exc: # pylint: disable=broad-except
+        return args, None, exc
+
+class FingerprintIndex():
+    """Fingerprints of the CIF files, grouped by formula, saved in a JSON file with the (mtime, size)
+    of each file: only new or modified files are fingerprinted again.
+    """
+
+    def __init__(self, folder, path):
+        self.folder = folder
+        self.path = path
+        self.ready = False
+        self._started = False
+        self._lock = threading.RLock()
+        self._entries = {} # filename -> {'mtime', 'size', 'fingerprint'}
+        self._by_formula = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add(self, filename, entry):
+        self._entries[filename] = entry
+        self._by_formula.setdefault(entry['fingerprint']['formula'], set()).add(filename)
+
+    def _remove(self, filename):
+        entry = self._entries.pop(filename)
+        self._by_formula[entry['fingerprint']['formula']].discard(filename)
+
+    def load(self):
+        with self._lock:
+            try:
+                with open(self.path) as handle:
+                    entries = json.load(handle)
+            except (OSError, ValueError):
+                entries = {}
+            for filename, entry in entries.get(self.folder, {}).items():
+                self._add(filename, entry)
+
+    def save(self):
+        with self._lock:
+            try:
+                with open(self.path) as handle:
+                    entries = json.load(handle)
+            except (OSError, ValueError):
+                entries = {}
+            entries[self.folder] = self._entries # one index for each CURATED-COFs folder
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+            with os.fdopen(handle, 'w') as tmp:
+                json.dump(entries, tmp)
+            os.replace(tmp_path, self.path)
+
+    def update(self, workers=1):
+        """Load the saved index and fingerprint only the files added or modified since then."""
+        self.load()
+        stats = {}
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith('.cif'):
+                stat = entry.stat()
+                stats[entry.name] = {'mtime': stat.st_mtime, 'size': stat.st_size}
+        with self._lock:
+            for filename in set(self._entries) - set(stats):
+                self._remove(filename)
+            todo = sorted(filename for filename, stat in stats.items()
+                          if {k: self._entries.get(filename, {}).get(k) for k in stat} != stat)
+        print("Fingerprinting {} new or modified CIF files...".format(len(todo)))
+        tasks = ((os.path.join(self.folder, filename),) for filename in todo)
+        results = imap_ordered(fingerprint_file, tasks, workers) if workers > 1 else map(_serial, tasks)
+        for filename, (_, fp, error) in zip(todo, results):
+            if error is not None:
+                print("WARNING: {} not fingerprinted ({})".format(filename, error))
+                continue
+            with self._lock:
+                self._add(filename, dict(stats[filename], fingerprint=fp))
+        self.save()
+        self.ready = True
+
+    def update_in_background(self):
+        """Start the update in a worker process of the job queue (see jobs.py), only once, not to parse all the CIF
+        files in the server process: the saved index is loaded when it is done.
+        """
+        from jobs import JOBS, QueueFull
+
+        with self._lock:
+            if self._started or not os.path.isdir(self.folder):
+                return
+            self._started = True
+        try:
+            job = JOBS.submit('server', 'fingerprints', update_index)
+        except QueueFull as exc:
+            print("WARNING: index of the CIF files not updated ({}).".format(exc))
+            self._started = False # tried again at the next parse
+            return
+        job.future.add_done_callback(lambda future: self._on_updated(job))
+
+    def _on_updated(self, job):
+        try:
+            job.result()
+        except Exception as exc: # pylint: disable=broad-except
+            print("WARNING: index of the CIF files not updated ({}).".format(exc))
+            self._started = False
+            return
+        self.load()
+        self.ready = True
+
+    def add_file(self, path, fp=None, save=True):
+        """Add (or update) a single CIF file, e.g., just written: fp is its fingerprint, if already computed
+        (e.g., by analyze_cif), otherwise the file is read.
+        """
+        stat = os.stat(path)
+        entry = {'mtime': stat.st_mtime, 'size': stat.st_size, 'fingerprint': fp or fingerprint_file(path)}
+        with self._lock:
+            filename = os.path.basename(path)
+            if filename in self._entries:
+                self._remove(filename)
+            self._add(filename, entry)
+            if save:
+                self.save()
+
+    def find_duplicates(self, fp):
+        """Files of the index that are likely the same structure as the fingerprint fp: list of (filename, distance),
+        closest first.
+        """
+        with self._lock:
+            candidates = [(f, self._entries[f]['fingerprint']) for f in self._by_formula.get(fp['formula'], ())]
+        found = [(filename, similarity(fp, other)) for filename, other in candidates]
+        return sorted(((f, d) for f, d in found if d is not None), key=lambda x: x[1])
+
+FINGERPRINTS = FingerprintIndex(CIFS_FOLDER, FINGERPRINTS_FILE)
+
+if __name__ == '__main__':
+    FINGERPRINTS.update(workers=os.cpu_count())
+    print("Index of {} CIF files saved in {}".format(len(FINGERPRINTS), FINGERPRINTS.path))
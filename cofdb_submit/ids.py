@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""Mint new CURATED-COFs paper and framework IDs, using an index of the IDs already in the CSV files."""
+
+import os
+import re
+import threading
+import contextlib
+from data import PAPERS_FILE, FRAMEWORKS_FILE, TABLES
+from snapshot import SNAPSHOT
+
+PAPER_ID_RE = re.compile(r'^p(\d{2})(\d{2})$') # e.g. p2101: year 2021, counter 01
+# framework ID: digits of the paper ID, counter of the framework in the paper, charge and dimensionality,
+# e.g., 05000N2 for the first framework of p0500
+FRAMEWORK_ID_RE = re.compile(r'^(\d{4})(\d+)([NC])([23])$')
+
+class IdIndex():
+    """Lookup tables for the IDs, built once from the snapshot of the CSV files and then fed only with the new rows:
+    DOI -> paper ID, year -> max paper counter, framework IDs, paper -> framework IDs.
+    Adding the same row twice is harmless, so reserved IDs can be added before the row is written.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        self.papers = set()
+        self.paper_by_doi = {}
+        self.paper_counter = {} # 'yy' -> max counter
+        self.framework_ids = set()
+        self.frameworks = {}    # paper ID -> set of framework IDs
+        self._state = {}        # path -> (generation, number of rows indexed)
+
+    def add_paper(self, paper_id, doi=None):
+        paper_id = str(paper_id)
+        self.papers.add(paper_id)
+        if doi: # empty if missing
+            self.paper_by_doi.setdefault(str(doi), paper_id)
+        match = PAPER_ID_RE.match(paper_id)
+        if match:
+            year, counter = match.group(1), int(match.group(2))
+            self.paper_counter[year] = max(counter, self.paper_counter.get(year, -1))
+
+    def add_framework(self, cof_id, paper_id=None):
+        """Index the framework ID, under paper_id (parsed from the framework ID, if None)."""
+        cof_id = str(cof_id)
+        self.framework_ids.add(cof_id)
+        if paper_id is None:
+            try:
+                paper_id = self.paper_of_framework(cof_id)
+            except ValueError as exc: # e.g., a row edited by hand: the ID is still taken
+                print("WARNING: {}".format(exc))
+                return
+        self.frameworks.setdefault(paper_id, set()).add(cof_id)
+
+    def paper_of_framework(self, cof_id):
+        """Paper ID of a framework ID (e.g., p0500 for 05000N2): raise a ValueError if the ID is malformed
+        or its paper is not indexed.
+        """
+        match = FRAMEWORK_ID_RE.match(cof_id)
+        if not match:
+            raise ValueError("malformed framework ID {}".format(cof_id))
+        paper_id = 'p' + match.group(1)
+        if paper_id not in self.papers:
+            raise ValueError("paper {} of the framework {} not found".format(paper_id, cof_id))
+        return paper_id
+
+    def _update(self, path, columns, add_row):
+        """Index the rows not seen yet, or everything if the table was reloaded from disk."""
+        generation = SNAPSHOT.generation(path)
+        last_generation, nrows = self._state.get(path, (None, 0))
+        if generation != last_generation:
+            if last_generation is not None:
+                return False # table changed on disk: the whole index needs to be rebuilt
+            nrows = 0
+        rows = SNAPSHOT.rows(path, columns, start=nrows)
+        if SNAPSHOT.generation(path) != generation: # changed on disk meanwhile
+            return False
+        for row in rows:
+            add_row(*row)
+        self._state[path] = (generation, nrows + len(rows))
+        return True
+
+    def update(self):
+        """Bring the index up to date with the CSV files."""
+        with self._lock:
+            try:
+                ok = self._update(PAPERS_FILE, ['paper_id', 'doi'], self.add_paper) and \
+                     self._update(FRAMEWORKS_FILE, ['cof_id'], self.add_framework)
+            except FileNotFoundError as exc:
+                raise FileNotFoundError("ERROR: {} not found... check the README!".format(
+                    os.path.basename(exc.filename or ''))) from exc
+            if not ok:
+                self.reset()
+                self.update()
+
+    def has_paper(self, paper_id):
+        with self._lock:
+            self.update()
+            return paper_id in self.papers
+
+    def paper_of_doi(self, doi):
+        """Paper ID of the DOI, or None if not present."""
+        with self._lock:
+            self.update()
+            return self.paper_by_doi.get(doi)
+
+    def has_framework(self, cof_id):
+        with self._lock:
+            self.update()
+            return cof_id in self.framework_ids
+
+    def mint_paper_id(self, doi, year, reserve=False):
+        """New paper ID: if reserve, it is added to the index (use it inside a transaction)."""
+        with self._lock:
+            self.update()
+            if doi in self.paper_by_doi:
+                return self.paper_by_doi[doi] + " (already present)"
+            counter = self.paper_counter.get(year[2:], -1) + 1
+            if counter > 99: # the framework IDs start with the 4 digits of the paper ID
+                return "ERROR: no paper IDs left for year {}.".format(year)
+            paper_id = "p{:s}{:02d}".format(year[2:], counter)
+            if reserve:
+                self.add_paper(paper_id, doi)
+            return paper_id
+
+    def mint_cof_id(self, paper_id, charge, dimensionality, reserve=False):
+        """New framework ID of the paper (e.g., 'p2101'): if reserve, it is added to the index (use it inside
+        a transaction). The counter skips the IDs already taken, e.g., by rows edited by hand.
+        """
+        with self._lock:
+            self.update()
+            counter = len(self.frameworks.get(paper_id, ()))
+            while True:
+                cof_id = "{paper}{counter}{charge}{dim}".format(paper=paper_id[1:], counter=str(counter),
+                                                                charge=charge, dim=dimensionality)
+                if cof_id not in self.framework_ids:
+                    break
+                counter += 1
+            if reserve:
+                self.add_framework(cof_id, paper_id)
+            return cof_id
+
+    @contextlib.contextmanager
+    def transaction(self, path):
+        """Mint and append as one critical section: yield the list for the new rows of the table (see
+        TableWriter.transaction). The IDs reserved in the block are forgotten if the block fails.
+        """
+        with self._lock, TABLES.transaction(path) as rows:
+            try:
+                yield rows
+            except BaseException:
+                self.reset()
+                raise
+
+ID_INDEX = IdIndex()
+
+def mint_paper_id(doi, year, reserve=False):
+    """Check if the paper is already in cof-papers.csv (same DOI) and print that value,
+    otherwise assign the new paper ID.
+    """
+    return ID_INDEX.mint_paper_id(doi, year, reserve)
+
+def mint_cof_id(paper_id, charge, dimensionality, reserve=False):
+    """Check the list of CURATED-COF IDs and assign a new one accordingly."""
+    return ID_INDEX.mint_cof_id(paper_id, charge, dimensionality, reserve)
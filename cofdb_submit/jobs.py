@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+"""Bounded queue of the heavy jobs of the forms (parsing, formatting, previews), run in a pool of worker processes
+shared by all the sessions of the server: a large framework parsed by a curator does not block the other sessions,
+and the throughput scales with the cores.
+
+Each session sees the status of its jobs (queued, running, done) and can cancel them. When the queue is full,
+new jobs are refused (QueueFull) instead of waiting: the form asks to try again later.
+"""
+
+import os
+import sys
+import time
+import uuid
+import threading
+import importlib
+from functools import partial
+from concurrent.futures.process import BrokenProcessPool
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__))) # for the worker processes to import this module
+
+JOB_WORKERS = int(os.environ.get('COFDB_JOB_WORKERS', 0)) or os.cpu_count() or 1
+JOB_QUEUE_SIZE = int(os.environ.get('COFDB_JOB_QUEUE', 4 * JOB_WORKERS)) # jobs queued or running, at most
+JOB_POLL_MS = 500 # update of the status shown in the forms
+
+class QueueFull(RuntimeError):
+    """Raised when a job is submitted to a full queue."""
+
+def _import_modules(folders, modules):
+    for folder in folders:
+        if folder not in sys.path:
+            sys.path.append(folder)
+    for module in modules:
+        importlib.import_module(module)
+
+def _run(folders, module, name, args, kwargs):
+    """Run in the worker: call the function (imported by name, as the Bokeh apps are not importable packages),
+    and return its result, the start and end time, and the stages timed meanwhile.
+    """
+    from timing import collect_stages
+
+    started = time.time()
+    _import_modules(folders, [module])
+    with collect_stages() as stages:
+        result = getattr(sys.modules[module], name)(*args, **kwargs)
+    return result, started, time.time(), stages
+
+class Job():
+    """A function call submitted to the JobQueue by a session."""
+
+    def __init__(self, session, kind, future, submitted):
+        self.session = session
+        self.kind = kind
+        self.future = future
+        self.submitted = submitted
+        self.started = self.finished = None
+        self.stages = []
+        self.cancelled = False
+        self.error = None # set if the job was lost with its pool
+
+    @property
+    def status(self):
+        """'queued', 'running', 'done', 'failed' or 'cancelled'. The pool marks as running also the job
+        waiting for the next free worker (one at most).
+        """
+        if self.cancelled or self.future.cancelled():
+            return 'cancelled'
+        if self.error is not None:
+            return 'failed'
+        if self.future.done():
+            return 'failed' if self.future.exception() is not None else 'done'
+        return 'running' if self.future.running() else 'queued'
+
+    def done(self):
+        """Whether the job is not queued or running anymore."""
+        return self.error is not None or self.future.done()
+
+    def cancel(self):
+        """Cancel the job: a job already running completes in its worker, but its result is discarded."""
+        self.cancelled = True
+        return self.future.cancel()
+
+    def result(self):
+        """Result of the function, or the exception it raised: call it when the job is done."""
+        if self.error is not None:
+            raise self.error
+        result, self.started, self.finished, self.stages = self.future.result()
+        return result
+
+    def add_timing(self, timer):
+        """Add the time spent in the queue and the stages timed in the worker to the timer of the callback."""
+        self.result()
+        timer.add('job_queue', self.started - self.submitted)
+        timer.stages.extend(self.stages)
+
+class JobQueue():
+    """Pool of worker processes with at most max_jobs jobs queued or running. A session has at most one job
+    of each kind: submitting a new one cancels the previous one (e.g., parsing again another file).
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_jobs=JOB_QUEUE_SIZE):
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.jobs = {} # last job of each (session, kind)
+        self.abandoned = [] # cancelled while running: they still occupy a worker
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def start(self, modules=()):
+        """Start the workers, importing the modules (e.g., 'pipeline') in each of them. Otherwise, the workers
+        are started by the first jobs.
+        """
+        with self.lock:
+            if self.pool is None:
+                self._create_pool(modules)
+                for _ in range(self.workers): # the pool starts a new worker while none is idle
+                    self.pool.submit(time.sleep, 0.1)
+
+    def _create_pool(self, modules=()):
+        from concurrent.futures import ProcessPoolExecutor
+        import multiprocessing
+
+        # spawn, not fork: the server process runs several threads (Tornado, thread pools)
+        self.pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_import_modules, initargs=(list(sys.path), list(modules)))
+
+    def _restart_pool(self, error):
+        """Fail the jobs of the broken pool that are not done yet, and replace it with a new one."""
+        for job in list(self.jobs.values()) + self.abandoned:
+            if not job.done():
+                job.error = error
+        self.pool.shutdown(wait=False)
+        self._create_pool()
+
+    def pending(self):
+        """Jobs queued or running, in order of submission."""
+        self.abandoned = [job for job in self.abandoned if not job.done()]
+        return sorted([job for job in self.jobs.values() if not job.done()] + self.abandoned,
+                      key=lambda job: job.submitted)
+
+    def _cancel(self, job):
+        if not job.cancel():
+            self.abandoned.append(job)
+
+    def submit(self, session, kind, func, *args, **kwargs):
+        """Submit func(*args, **kwargs) as a job of the session: return the Job, or raise QueueFull.
+        func must be a module-level function, and its arguments and result picklable.
+        """
+        path = getattr(sys.modules[func.__module__], '__file__', None) # None for the built-in modules
+        folders = [os.path.dirname(os.path.abspath(path))] if path else []
+        with self.lock:
+            previous = self.jobs.get((session, kind))
+            pending = [job for job in self.pending() if job is not previous] # the job replaced frees its slot
+            if len(pending) >= self.max_jobs: # the previous job is kept
+                raise QueueFull("The server is busy ({} jobs in the queue): try again in a minute.".format(
+                    len(pending)))
+            if self.pool is None:
+                self._create_pool()
+            submitted = time.time()
+            try:
+                future = self.pool.submit(_run, folders, func.__module__, func.__name__, args, kwargs)
+            except BrokenProcessPool as exc: # a worker died (e.g., killed when out of memory): the pool is unusable
+                print("WARNING: {}: starting a new pool of workers.".format(exc))
+                self._restart_pool(exc)
+                future = self.pool.submit(_run, folders, func.__module__, func.__name__, args, kwargs)
+            if previous is not None: # only once the new job is accepted
+                self._cancel(previous)
+            job = self.jobs[(session, kind)] = Job(session, kind, future, submitted)
+        return job
+
+    def session_jobs(self, session):
+        """Last job of each kind of the session."""
+        with self.lock:
+            return [job for (owner, _), job in self.jobs.items() if owner == session]
+
+    def cancel(self, session, kind=None):
+        """Cancel the jobs of the session (only the ones of that kind, if given), and forget them."""
+        with self.lock:
+            for key in [key for key in self.jobs if key[0] == session and kind in (None, key[1])]:
+                self._cancel(self.jobs.pop(key))
+
+    def describe(self, job):
+        """Status of the job for the form, e.g., 'parse_cif: queued (3 jobs ahead)'."""
+        status = job.status
+        if status == 'queued':
+            with self.lock:
+                pending = self.pending()
+            ahead = sum(other.submitted < job.submitted and other.status == 'queued' for other in pending)
+            return "{}: queued ({} jobs ahead)".format(job.kind, ahead)
+        if status == 'running':
+            return "{}: running ({:.0f} s since submitted)".format(job.kind, time.time() - job.submitted)
+        if status == 'done' and job.started is not None:
+            return "{}: done in {:.1f} s (queued {:.1f} s)".format(job.kind, job.finished - job.started,
+                                                                   job.started - job.submitted)
+        if status == 'failed':
+            return "{}: failed ({})".format(job.kind, job.error or job.future.exception())
+        return "{}: {}".format(job.kind, status)
+
+JOBS = JobQueue() # shared by all the sessions
+
+class SessionJobs():
+    """Jobs of the session, with a text showing their status and a button to cancel them (e.g., in a form)."""
+
+    def __init__(self, queue=JOBS):
+        import panel as pn
+
+        self.queue = queue
+        self.session = uuid.uuid4().hex
+        self.status = pn.widgets.StaticText(name='Jobs', value='')
+        self.btn_cancel = pn.widgets.Button(name='Cancel', button_type='default')
+        self.btn_cancel.on_click(self.cancel)
+        self.doc = pn.state.curdoc
+        self.polling = None
+        if self.doc is not None: # the jobs of a closed page are not needed anymore
+            self.doc.on_session_destroyed(lambda session_context: self.queue.cancel(self.session))
+
+    def submit(self, kind, callback, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in the queue, and call callback(job) in the session when the job is done
+        (not if cancelled). If the queue is full, show it and raise QueueFull.
+        """
+        try:
+            job = self.queue.submit(self.session, kind, func, *args, **kwargs)
+        except QueueFull as exc:
+            self.status.value = "ERROR: {}".format(exc)
+            raise
+        if self.doc is None: # e.g., in the notebook
+            self.on_done(job, callback)
+            return job
+        job.future.add_done_callback(lambda f: self.doc.add_next_tick_callback(partial(self.on_done, job, callback)))
+        self.update()
+        if self.polling is None:
+            self.polling = self.doc.add_periodic_callback(self.update, JOB_POLL_MS)
+        return job
+
+    def on_done(self, job, callback):
+        if not job.cancelled:
+            callback(job)
+        self.update()
+
+    def update(self):
+        """Show the status of the jobs, and stop updating it when none is queued or running."""
+        jobs = self.queue.session_jobs(self.session)
+        self.status.value = "<br>".join(self.queue.describe(job) for job in jobs)
+        if self.polling is not None and all(job.done() for job in jobs):
+            self.doc.remove_periodic_callback(self.polling)
+            self.polling = None
+
+    def cancel(self, event=None, kind=None):
+        """Cancel the jobs of the session (only the ones of that kind, if given)."""
+        self.queue.cancel(self.session, kind)
+        self.update()
@@ -1,55 +1,20 @@
 #!/usr/bin/env python
 """Add new entries to the CURATED-COFs files: cof-papers.csv and cof-frameworks.csv."""
 
-import os
-import numpy as np
-import panel as pn
-import datetime
-import pandas as pd
-from data import PAPERS_FILE, FRAMEWORKS_FILE, CIFS_FOLDER
-
-def get_papers_df():
-    try:
-        papers_df = pd.read_csv(PAPERS_FILE) # needs to be loaded each time, to have the last entries!
-    except FileNotFoundError:
-        raise FileNotFoundError("ERROR: cof-papers.csv not found... check the README!")
-    return papers_df
-
-def get_frameworks_df():
-    try:
-        frameworks_df = pd.read_csv(FRAMEWORKS_FILE) # needs to be loaded each time, to have the last entries!
-    except FileNotFoundError:
-        raise FileNotFoundError("ERROR: cof-frameworks.csv not found... check the README!")
-    return frameworks_df
-
-def mint_paper_id(doi, year):
-    """Check if the paper is already in cof-papers.csv (same DOI) and print that value,
-    otherwise assign the new paper ID.
-    """
-
-    papers_df = get_papers_df()
-
-    if doi in papers_df['DOI'].values:
-        return str(papers_df[papers_df['DOI'] == doi]['CURATED-COFs paper ID'].values[0]) + " (already present)"
-
-    id_year = sorted(papers_df[papers_df['CURATED-COFs paper ID'].str.contains("p"+year[2:])]['CURATED-COFs paper ID'])
-    if len(id_year)==0:
-        counter = 0
-    else:
-        last_id_year = id_year[-1]
-        last_counter_year = int(last_id_year[3:5])
-        counter = last_counter_year + 1
+import time
+SESSION_START = time.perf_counter() # to measure the time to build the page of a new session
 
-    return "p{:s}{:02d}".format(year[2:], counter)
-
-def mint_cof_id(paper_id, charge, dimensionality):
-    """Check the list of CURATED-COF IDs and assign a new one accordingly."""
-
-    frameworks_df = get_frameworks_df()
-    other_cofs = [ id for id in frameworks_df["CURATED-COFs ID"] if id.startswith(paper_id[1:])]
-    counter = len(other_cofs)
-    return "{paper}{counter}{charge}{dim}".format(paper=paper_id[1:], counter=str(counter), charge=charge,
-                                                  dim=dimensionality)
+import panel as pn
+from data import PAPERS_FILE
+from snapshot import get_modifications_options
+from ids import ID_INDEX, mint_paper_id, mint_cof_id
+from doi import EXECUTOR, normalize_doi, fetch_metadata_async, paper_info
+from papers import add_papers
+from pipeline import analyze_cif, check_cif_size, save_upload, format_cif_cached, write_framework
+from fingerprints import FINGERPRINTS
+from timing import Timer, report_session
+from preview import PREVIEW_MAX_ATOMS, PREVIEW_SIZE, preview
+from jobs import SessionJobs, QueueFull
 
 pn.extension()
 
@@ -63,57 +28,56 @@ inp_paper_id = pn.widgets.TextInput(name='CURATED-COFs paper ID', placeholder=''
 
 div_out = pn.widgets.StaticText(name='Output', value='')
 btn_add_paper = pn.widgets.Button(name='Add paper', button_type='primary')
+div_timing_paper = pn.widgets.StaticText(name='Timing', value='')
 
 def on_click_fetch(event):
-    """Get metadata for DOI, and return an error if the DOI is not valid (no metadata found)."""
-    import dateutil
-    from crossref.restful import Works
-    import json
+    """Get metadata for DOI in a thread, and fill the form when done (see on_fetch_done)."""
+    from functools import partial
 
     # turn the "Add paper" primary, to remember clicking it again!
     btn_add_paper.button_type = 'primary'
 
     # Input DOI: (1) if empty use test DOI (2) If Angewandte German Edition, change with International Edition
-    inp_doi.value = inp_doi.value.replace("ange","anie") or "10.1021/jacs.9b01891"
-
-    works = Works()
-    print("Querying Crossref API for doi {} (this can take several seconds, depending on the server...)".format(inp_doi.value))
-    metadata = works.doi(inp_doi.value)
-    print("Query done!")
-    #print(json.dumps(metadata,sort_keys=True, indent=4)) # Use for debug!
-
-    if not metadata:
-        btn_doi.button_type = 'danger'
-        inp_title.value = inp_year.value = inp_reference.value = inp_paper_id.value = "ERROR: wrong/missing DOI."
-        return
-
-    inp_title.value = str(metadata['title'][0])
-    journal = str(metadata['short-container-title'][0])
-
-    if 'volume' in metadata:
-        already_in_issue = True
-        volume = metadata['volume']
-        if 'published-print' in metadata: # ACS, wiley
-            year = str(metadata['published-print']['date-parts'][0][0])
-        elif 'created' in metadata: # RSC
-            year = str(metadata['created']['date-parts'][0][0])
-        else:
-            year = 'ERROR: year not found.'
-    else: # not yet in an issue: assuming that it will be published at the same year of today
-        already_in_issue = False
-        year = str(datetime.datetime.now().year)
-
-    inp_year.value = year
-
-    if already_in_issue:
-        if 'page' in metadata: # most of the journals
-            inp_reference.value = "{}, {}, {}, {}".format(journal, year, volume, metadata['page'])
-        else:  # NatComm or not yet in an issue
-            inp_reference.value = "{}, {}, {}".format(journal, year, volume)
+    inp_doi.value = normalize_doi(inp_doi.value) or "10.1021/jacs.9b01891"
+
+    # the query can take several seconds: do not block the server meanwhile
+    btn_doi.button_type = 'warning'
+    timer = Timer('on_click_fetch', doi=inp_doi.value)
+    future = fetch_metadata_async(inp_doi.value)
+    future.add_done_callback(lambda f: timer.add('fetch_metadata', timer.elapsed()))
+    doc = pn.state.curdoc
+    if doc is None: # e.g., in the notebook
+        on_fetch_done(future, timer)
     else:
-        inp_reference.value = "{}, {}, {}".format(journal, year, "in press")
-    inp_paper_id.value = mint_paper_id(doi=inp_doi.value, year=inp_year.value)
-    btn_doi.button_type = 'success'
+        future.add_done_callback(lambda f: doc.add_next_tick_callback(partial(on_fetch_done, f, timer)))
+
+def on_fetch_done(future, timer=None):
+    """Fill the form with the metadata, and return an error if the DOI is not valid (no metadata found)."""
+    timer = timer or Timer('on_fetch_done')
+    try:
+        with timer:
+            try:
+                metadata = future.result()
+            except Exception as exc: # pylint: disable=broad-except
+                print("Query failed: {}".format(exc))
+                metadata = None
+            #print(json.dumps(metadata,sort_keys=True, indent=4)) # Use for debug!
+
+            if not metadata:
+                btn_doi.button_type = 'danger'
+                inp_title.value = inp_year.value = inp_reference.value = inp_paper_id.value = \
+                    "ERROR: wrong/missing DOI."
+                return
+
+            info = paper_info(metadata)
+            inp_title.value = info['title']
+            inp_year.value = info['year']
+            inp_reference.value = info['reference']
+            with timer.stage('mint_paper_id'):
+                inp_paper_id.value = mint_paper_id(doi=inp_doi.value, year=inp_year.value)
+            btn_doi.button_type = 'success'
+    finally:
+        div_timing_paper.value = timer.summary('<br>')
 
 btn_doi.on_click(on_click_fetch)
 
@@ -128,16 +92,52 @@ def on_click_add(event):
 
     btn_add_paper.button_type = 'primary'
 
-    line = '{id},"{ref}",{doi},"{title}"\n'.format(id=inp_paper_id.value, ref=inp_reference.value,
-                                                  doi=inp_doi.value, title=inp_title.value)
-    print(line)
-    with open(PAPERS_FILE, 'a+') as handle:
-        handle.write(line)
+    # mint and append in a single critical section, in case another session added a paper in the meantime
+    with ID_INDEX.transaction(PAPERS_FILE) as rows:
+        if ID_INDEX.has_paper(inp_paper_id.value) or ID_INDEX.paper_of_doi(inp_doi.value):
+            inp_paper_id.value = mint_paper_id(doi=inp_doi.value, year=inp_year.value, reserve=True)
+            if "(already present)" in inp_paper_id.value:
+                btn_add_paper.button_type = 'danger'
+                print(inp_paper_id.value + " Paper not added because of some problem.")
+                return
+        rows.append([inp_paper_id.value, inp_reference.value, inp_doi.value, inp_title.value])
+        print(rows[-1])
 
     btn_add_paper.button_type = 'success'
 
 btn_add_paper.on_click(on_click_add)
 
+inp_dois = pn.widgets.input.TextAreaInput(name='Bulk DOIs', placeholder='One DOI per line...', height=150)
+btn_add_papers = pn.widgets.Button(name='Add all papers', button_type='primary')
+div_bulk = pn.widgets.StaticText(name='Bulk output', value='')
+
+def on_click_add_papers(event):
+    """Fetch the metadata of all the DOIs (in a thread) and add the new papers to cof-papers.csv at once."""
+    from functools import partial
+
+    btn_add_papers.button_type = 'warning'
+    div_bulk.value = "Fetching metadata..."
+    future = EXECUTOR.submit(add_papers, inp_dois.value.splitlines())
+    doc = pn.state.curdoc
+    if doc is None:
+        on_add_papers_done(future)
+    else:
+        future.add_done_callback(lambda f: doc.add_next_tick_callback(partial(on_add_papers_done, f)))
+
+def on_add_papers_done(future):
+    try:
+        entries = future.result()
+    except Exception as exc: # pylint: disable=broad-except
+        btn_add_papers.button_type = 'danger'
+        div_bulk.value = "ERROR: {}".format(exc)
+        return
+    lines = ["{}: {} {}".format(e['doi'], e['status'], e['paper_id'] or e['error']) for e in entries]
+    div_bulk.value = "<br>".join(lines)
+    failed = any(e['status'] == 'failed' for e in entries)
+    btn_add_papers.button_type = 'danger' if failed else 'success'
+
+btn_add_papers.on_click(on_click_add_papers)
+
 column = pn.Column(
     pn.pane.HTML("""<h2>Add Paper</h2>"""),
     pn.Row(inp_doi, btn_doi),
@@ -146,6 +146,11 @@ column = pn.Column(
     inp_reference,
     inp_paper_id,
     btn_add_paper,
+    div_timing_paper,
+    pn.pane.HTML("""<h3>Add many papers</h3>"""),
+    inp_dois,
+    btn_add_papers,
+    div_bulk,
 )
 
 column.servable()
@@ -164,11 +169,18 @@ class CifForm():
         self.ckbox_2x = pn.widgets.Checkbox(name='Force to replicate 2x in C direction')
         self.ckbox_relabel_cab = pn.widgets.Checkbox(name='Relabel cell vectors abc to cab')
         self.ckbox_relabel_bca = pn.widgets.Checkbox(name='Relabel cell vectors abc to bca')
+        self.div_relabel = pn.widgets.StaticText(name='Cell vectors', value='')
 
-        from structure import structure_jsmol
         import bokeh.models as bmd
         self.jsmol_script_source = bmd.ColumnDataSource()
-        self.applet = structure_jsmol(self.jsmol_script_source)
+        self.applet = None # created on demand, see show_jsmol
+        self.script = None # for the applet
+        self.preview = pn.pane.PNG(None, width=PREVIEW_SIZE[0], height=PREVIEW_SIZE[1])
+        self.btn_jsmol = pn.widgets.Button(name='Show in JSmol', button_type='default')
+        self.btn_jsmol.on_click(self.show_jsmol)
+        self.viewer = pn.Column()
+        self.jobs = SessionJobs() # the parsing, formatting and previews run in the worker processes
+        self.jobs.btn_cancel.on_click(self.on_click_cancel)
 
         self.inp_source = pn.widgets.Select(name='CIF source', 
             options={'SI': 'SI', 
@@ -177,11 +189,13 @@ class CifForm():
                      'Private Communication': "Priv. Comm."})
         self.inp_csd = pn.widgets.TextInput(name='CSD Number', placeholder='1846139')
         self.inp_name = pn.widgets.TextInput(name='CIF name', placeholder='As used in publication')
+        self.div_duplicates = pn.widgets.StaticText(name='Possible duplicates', value='')
+        self.div_timing = pn.widgets.StaticText(name='Timing', value='')
         self.inp_dimensionality = pn.widgets.TextInput(name='CIF dimensionality', placeholder='Detected by ASE')
         self.inp_elements = pn.widgets.TextInput(name='CIF elements', placeholder='C,H,...')
         self.inp_modifications = pn.widgets.AutocompleteInput(
             name='CIF modifications', value='none', 
-            options=list(set(get_frameworks_df()['Modifications'])), restrict=False)
+            options=get_modifications_options(), restrict=False)
         self.inp_charge = pn.widgets.Select(name='CIF charge', options={ 'Neutral': 'N', 'Charged': 'C' })
         self.inp_cof_id = pn.widgets.TextInput(name='COF ID', value='none')
         self.btn_mint_id = pn.widgets.Button(name='Mint', button_type='primary')
@@ -199,6 +213,7 @@ class CifForm():
             source = self.inp_source.value
         return {
             'cof_id': self.inp_cof_id.value,
+            'paper_id': inp_paper_id.value.split()[0] if inp_paper_id.value else '', # without "(already present)"
             'source': source,
             'name': self.inp_name.value,
             'dimensionality': self.inp_dimensionality.value,
@@ -217,10 +232,13 @@ class CifForm():
                     self.btn_cif,
                     self.ckbox_relabel_cab,
                     self.ckbox_relabel_bca,
-                    self.ckbox_2x
+                    self.ckbox_2x,
+                    self.div_relabel
                 )
             ),
-            pn.pane.Bokeh(self.applet),
+            pn.Row(self.jobs.status, self.jobs.btn_cancel),
+            self.viewer,
+            self.div_duplicates,
             pn.Row(self.inp_source, self.inp_csd),
             self.inp_name,
             self.inp_dimensionality,
@@ -229,105 +247,141 @@ class CifForm():
             self.inp_charge,
             pn.Row(self.inp_cof_id, self.btn_mint_id),
             self.btn_add_cif,
+            self.div_timing,
         )
         return self.column.servable()
 
     def on_click_parse(self, event):
-        """Load the CIF, unwrap it to P1 using ASE, extract some info, and display it."""
-        from ase.io import read, write
-        from ase.io.cif import write_cif
-        from ase.geometry.dimensionality import analyze_dimensionality
-        from ase.build import make_supercell
-        from io import StringIO, BytesIO
-        import re
-
-        # turn "Add CIF" button primary, to remember clicking it again!
-        self.btn_add_cif.button_type = 'primary'
-
-        # assign the filename as the first guess for the COF name, which can be manually corrected
-        self.inp_name.value = self.inp_cif.filename.split(".")[0]
-
-        # read the CIF file and get useful information
-        cif_str = self.inp_cif.value.decode()
-        # print(self.inp_cif.param.get_param_values()) # Use for debug!
-        atoms = read(StringIO(cif_str), format='cif')
-
-        formula = atoms.get_chemical_formula()
-        elements = [e for e in re.split(r'\d+', formula) if e]
-        self.inp_elements.value = ",".join(elements)
-        self.inp_modifications.value = 'none'
-
-        # If the user selects the proper checkbox, rotate the cell
-        if self.ckbox_relabel_cab.value:
-            print("USER CHOICE: relabel cell vectors to CAB")
-            a, b, c = atoms.cell
-            atoms.set_cell([ c, a, b ])
-        if self.ckbox_relabel_bca.value:
-            print("USER CHOICE: relabel cell vectors to BCA")
-            a, b, c = atoms.cell
-            atoms.set_cell([ b, c, a ])
-
-        # If the 2x replication was chosen go with that, otherwise check first if there is the need
-        # NOTE: this is usefull because sometime the layers are close by and ASE recognizes it as a 3D frameworks,
-        #       but you want to force the choice of assuming it is a 2D COF and need 2 layers
-
-        if self.ckbox_2x.value:
-            print("USER CHOICE: force the frameworks to be 2D and duplicate 2x in C direction")
-            self.inp_dimensionality.value = '2D'
-            atoms = make_supercell(atoms, np.diag([1,1,2]))
-            self.inp_modifications.value = 'replicated 2x in C direction'
+        """Load the CIF, unwrap it to P1 using ASE and extract some info in a worker process (see on_parse_done)."""
+        from functools import partial
+
+        timer = Timer('CifForm.on_click_parse', file=self.inp_cif.filename, bytes=len(self.inp_cif.value or b''))
+        try:
+            with timer:
+                # turn "Add CIF" button primary, to remember clicking it again!
+                self.btn_add_cif.button_type = 'primary'
+
+                # assign the filename as the first guess for the COF name, which can be manually corrected
+                self.inp_name.value = self.inp_cif.filename.split(".")[0]
+
+                # If the user selects only one of the checkboxes, rotate the cell (selecting both gives back abc)
+                relabel = None
+                if self.ckbox_relabel_cab.value != self.ckbox_relabel_bca.value:
+                    relabel = 'cab' if self.ckbox_relabel_cab.value else 'bca'
+                self.div_relabel.value = ''
+
+                # refuse large files before parsing them, showing why
+                try:
+                    check_cif_size(len(self.inp_cif.value))
+                except ValueError as exc:
+                    self.inp_dimensionality.value = str(exc)
+                    raise
+
+                # read the CIF file and get useful information in a worker, not to block the other sessions
+                # print(self.inp_cif.param.get_param_values()) # Use for debug!
+                self.btn_cif.button_type = 'warning'
+                done_timer = Timer('CifForm.on_parse_done', file=self.inp_cif.filename)
+                with timer.stage('save_upload'):
+                    upload = save_upload(self.inp_cif.value) # read by the worker, instead of pickling the bytes
+                try:
+                    job = self.jobs.submit('parse_cif', partial(self.on_parse_done, relabel=relabel, timer=done_timer),
+                                           analyze_cif, upload, relabel=relabel, replicate=self.ckbox_2x.value)
+                except QueueFull:
+                    upload.unlink()
+                    self.btn_cif.button_type = 'danger'
+                    raise
+                job.future.add_done_callback(lambda future: upload.unlink()) # also if cancelled
+        finally:
+            self.div_timing.value = timer.summary('<br>')
+
+    def on_parse_done(self, job, relabel, timer):
+        """Fill the form with the info extracted from the CIF, and display the structure."""
+        self.btn_cif.button_type = 'danger' if job.status == 'failed' else 'primary'
+        try:
+            with timer:
+                job.add_timing(timer)
+                result = job.result()
+                self.inp_elements.value = result['elements']
+                self.inp_dimensionality.value = result['dimensionality']
+                self.inp_modifications.value = result['modifications']
+
+                # show the relabel applied, without ticking the checkboxes: they are only the choice of the user
+                if result['relabel'] is None:
+                    self.div_relabel.value = "abc"
+                elif result['relabel'] != relabel:
+                    self.div_relabel.value = "abc relabeled to {} automatically, to have the layers on the XY plane" \
+                        .format(result['relabel'])
+                else:
+                    self.div_relabel.value = "abc relabeled to {}".format(result['relabel'])
+
+                self.atoms = result['atoms']
+                self.fingerprint = result['fingerprint']
+                self.cache_key = result['cache_key'] # to format the CIF once, in the same cache entry
+                timer.info['atoms'] = len(self.atoms)
+
+                print(f"Display: {self.inp_cif.filename}")
+                with timer.stage('display', chars=len(result['viewer_script'])) as info:
+                    self.script = result['viewer_script']
+                    info['viewer'] = 'preview' if len(self.atoms) > PREVIEW_MAX_ATOMS else 'jsmol'
+                    if info['viewer'] == 'preview': # JSmol only on demand, as it is slow in the browser
+                        self.show_preview()
+                    else:
+                        self.show_jsmol()
+                with timer.stage('check_duplicates'):
+                    self.check_duplicates()
+        finally:
+            self.div_timing.value = timer.summary('<br>')
+
+    def on_click_cancel(self, event):
+        """Turn the buttons primary again: the jobs of the session are cancelled by SessionJobs."""
+        self.btn_cif.button_type = self.btn_add_cif.button_type = 'primary'
+
+    def check_duplicates(self):
+        """Warn if the structure is likely already in the cifs/ folder."""
+        if not FINGERPRINTS.ready:
+            FINGERPRINTS.update_in_background()
+            self.div_duplicates.value = "Index of the CIF files not ready yet: parse again later to check."
+            return
+        duplicates = FINGERPRINTS.find_duplicates(self.fingerprint)
+        if duplicates:
+            self.div_duplicates.value = "WARNING: similar to " + ", ".join(
+                "{} (distance {:.3f})".format(filename, distance) for filename, distance in duplicates)
         else:
-            intervals = analyze_dimensionality(atoms, method='RDA')
-            if intervals[0].dimtype == '2D':
-                self.inp_dimensionality.value = '2D'
-
-                # Check if it is correcly oriented, and extend to two layers if onyly one is present
-                z_min_thr = 6 #if less, it is likely a single layer
-                cell_lengths = atoms.get_cell_lengths_and_angles()[0:3]
-                if cell_lengths[0] < z_min_thr or cell_lengths[1] < z_min_thr: # X or Y are perpendicular the layer
-                    self.inp_dimensionality.value = "ERROR: you need to rotate the axes to have the layers on XY plane."
-                    self.inp_modifications.value = "ERROR: you need to rotate the axes to have the layers on XY plane."
-                if cell_lengths[2] < z_min_thr: # Z is perpendicular to a single layer
-                    atoms = make_supercell(atoms, np.diag([1,1,2]))
-                    self.inp_modifications.value = 'replicated 2x in C direction'
-            else:
-                self.inp_dimensionality.value = '3D'
-
-        self.atoms = atoms
-        import tempfile
-        with tempfile.TemporaryFile() as handle:
-            write(handle, atoms, format='cif')
-            handle.seek(0)
-            self.cif_str = handle.read()
-
-        print(f"Display: {self.inp_cif.filename}")
-        self.display(self.cif_str.decode())
+            self.div_duplicates.value = "none"
 
 
     def on_click_add(self, event):
-        """Add framework to list and add CIF file to cifs/ folder."""
-        from ase.io import write
+        """Add framework to list and add CIF file to cifs/ folder, formatted in a worker (see on_add_done)."""
+        from functools import partial
+
         info = self.info_dict
         if not all(v for k,v in info.items() if k not in ['modifications']):
             self.btn_add_cif.button_type = 'danger'
             return
 
-        self.btn_add_cif.button_type = 'primary'
-        line = '{id},{source},"{name}","{elements}","{mod}"\n'.format(
-            id=info['cof_id'], source=info['source'], name=info['name'], elements = info['elements'],
-            mod=info['modifications'])
-        print(line)
-        with open(FRAMEWORKS_FILE, 'a+') as handle:
-           handle.write(line)
-
-        cif_path = os.path.join(CIFS_FOLDER, info['cof_id'] + '.cif')
-
-        print("Writing {}".format(cif_path))
-        write(cif_path, self.atoms)
-
-        # Using manage_crystal to use the standard formatting
-        from manage_crystal.utils import parse_and_write
-        parse_and_write(cif_path, cif_path)
+        self.btn_add_cif.button_type = 'warning'
+        timer = Timer('CifForm.on_click_add', cof_id=info['cof_id'], atoms=len(self.atoms))
+        try:
+            # Using manage_crystal to use the standard formatting
+            self.jobs.submit('format_cif', partial(self.on_add_done, info=info, fingerprint=self.fingerprint,
+                                                   timer=timer), format_cif_cached, self.cache_key, self.atoms)
+        except QueueFull:
+            self.btn_add_cif.button_type = 'danger'
+            raise
+
+    def on_add_done(self, job, info, fingerprint, timer):
+        """Write the framework and its formatted CIF file."""
+        self.btn_add_cif.button_type = 'danger' if job.status == 'failed' else 'primary'
+        try:
+            with timer:
+                job.add_timing(timer)
+                cif_path = write_framework(info, job.result())
+                if FINGERPRINTS.ready:
+                    with timer.stage('fingerprint'):
+                        FINGERPRINTS.add_file(cif_path, fingerprint)
+        finally:
+            self.div_timing.value = timer.summary('<br>')
+        self.inp_cof_id.value = info['cof_id'] # changed if another session took the ID in the meantime
 
         self.btn_add_cif.button_type = 'success'
 
@@ -340,17 +394,39 @@ class CifForm():
         paper_id = inp_paper_id.value.split()[0]
         self.inp_cof_id.value = mint_cof_id(paper_id, self.inp_charge.value, self.inp_dimensionality.value[0])
 
-    def display(self, cif_str):
-        """Update applet to show CIF."""
-        from structure import structure_jsmol
-
-        self.jsmol_script_source.data['script'] = [
-"""load data "cifstring"
-{}
-end "cifstring"
-""".format(str(cif_str))]
-        #print(self.jsmol_script_source.data['script'])
+    def display(self, script):
+        """Update applet to show the structure, unless it is already shown (e.g., parsing again the same file)."""
+        if script != self.jsmol_script_source.data.get('script', [None])[0]:
+            self.jsmol_script_source.data['script'] = [script]
+
+    def show_jsmol(self, event=None):
+        """Show the structure in the JSmol applet, creating it the first time."""
+        if self.applet is None:
+            from structure import structure_jsmol
+            self.applet = pn.pane.Bokeh(structure_jsmol(self.jsmol_script_source))
+        self.jobs.cancel(kind='preview') # a preview still rendering is not shown anymore
+        self.viewer.objects = [self.applet]
+        if self.script is not None:
+            self.display(self.script)
+
+    def show_preview(self):
+        """Show a static image of the structure (viewed along c), rendered in a worker, with a button for JSmol."""
+        self.preview.object = None
+        self.viewer.objects = [self.preview, self.btn_jsmol]
+        try:
+            self.jobs.submit('preview', self.on_preview_done, preview, self.atoms)
+        except QueueFull:
+            self.show_jsmol()
+
+    def on_preview_done(self, job):
+        try:
+            self.preview.object = job.result()
+        except Exception as exc: # pylint: disable=broad-except
+            print("Preview failed: {}".format(exc))
+            self.show_jsmol()
 
 
 cif = CifForm()
 cif.servable()
+
+report_session('cofdb_submit', SESSION_START)
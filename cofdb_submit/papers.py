@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""Add many papers at once to cof-papers.csv from a list of DOIs, fetching their metadata concurrently.
+
+Usage example:
+    python cofdb_submit/papers.py dois.txt --report report.json
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from data import PAPERS_FILE
+from ids import ID_INDEX, mint_paper_id
+from doi import normalize_doi, fetch_metadata, query_crossref, paper_info
+
+class RateLimiter():
+    """Let at most rate calls per second pass wait(), from any thread."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+def fetch_all(dois, workers=4, rate=5):
+    """Fetch the metadata of the DOIs with a pool of threads, querying Crossref at most rate times per second
+    (cached DOIs do not count): return a list of (metadata, error), in the same order of the DOIs.
+    """
+    limiter = RateLimiter(rate)
+
+    def query(doi):
+        limiter.wait()
+        return query_crossref(doi)
+
+    def fetch(doi):
+        try:
+            return fetch_metadata(doi, query=query), None
+        except Exception as exc: # pylint: disable=broad-except
+            return None, exc
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fetch, dois))
+
+def add_papers(dois, workers=4, rate=5):
+    """Fetch the metadata of the DOIs, then mint consecutive paper IDs and write all the new papers at once.
+    Return the list of the entries for the report.
+    """
+    dois = list(dict.fromkeys(normalize_doi(doi) for doi in dois if doi.strip())) # keep order, drop duplicates
+    entries = [{'doi': doi, 'status': 'failed', 'paper_id': None, 'error': None} for doi in dois]
+    for entry in entries:
+        paper_id = ID_INDEX.paper_of_doi(entry['doi'])
+        if paper_id:
+            entry.update(status='present', paper_id=paper_id)
+    to_fetch = [entry for entry in entries if entry['status'] != 'present']
+    fetched = fetch_all([entry['doi'] for entry in to_fetch], workers=workers, rate=rate)
+
+    infos = [] # (entry, info) of the papers to add: a DOI with bad metadata fails alone, before the transaction
+    for entry, (metadata, error) in zip(to_fetch, fetched):
+        try:
+            if error is not None:
+                raise error
+            if not metadata:
+                raise ValueError("wrong/missing DOI.")
+            info = paper_info(metadata)
+            if info['year'].startswith('ERROR'):
+                raise ValueError(info['year'])
+        except Exception as exc: # pylint: disable=broad-except
+            entry['error'] = "{}: {}".format(type(exc).__name__, exc)
+            continue
+        infos.append((entry, info))
+
+    with ID_INDEX.transaction(PAPERS_FILE) as rows:
+        for entry, info in infos:
+            doi = entry['doi']
+            paper_id = mint_paper_id(doi=doi, year=info['year'], reserve=True)
+            if "(already present)" in paper_id:
+                entry.update(status='present', paper_id=paper_id.split()[0])
+                continue
+            if paper_id.startswith('ERROR'):
+                entry['error'] = paper_id
+                continue
+            rows.append([paper_id, info['reference'], doi, info['title']])
+            entry.update(status='added', paper_id=paper_id, reference=info['reference'], title=info['title'])
+
+    return entries
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path', help='text file with one DOI per line (use - for stdin)')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent queries to Crossref')
+    parser.add_argument('--rate', type=float, default=5, help='max queries to Crossref per second')
+    parser.add_argument('--report', default=None, help='JSON file for the summary report (default: stdout)')
+    args = parser.parse_args(argv)
+
+    if args.path == '-':
+        dois = sys.stdin.read().splitlines()
+    else:
+        with open(args.path) as handle:
+            dois = handle.read().splitlines()
+
+    entries = add_papers(dois, workers=args.workers, rate=args.rate)
+    for entry in entries:
+        print("{}: {} {}".format(entry['doi'], entry['status'], entry['paper_id'] or entry['error']))
+
+    nfailed = sum(entry['status'] == 'failed' for entry in entries)
+    report = {
+        'total': len(entries),
+        'added': sum(entry['status'] == 'added' for entry in entries),
+        'present': sum(entry['status'] == 'present' for entry in entries),
+        'failed': nfailed,
+        'papers': entries,
+    }
+    if args.report:
+        with open(args.report, 'w') as handle:
+            json.dump(report, handle, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    print("Added {} of {} papers ({} already present, {} failed).".format(
+        report['added'], report['total'], report['present'], nfailed))
+    return 1 if nfailed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
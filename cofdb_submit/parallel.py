@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""Run the CPU-bound processing of many structures in a pool of worker processes."""
+
+import os
+import time
+import itertools
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+
+def _serve(func, connection):
+    """Loop of a worker process: call func on the args received, and send back (True, result) or (False, error)."""
+    for args in iter(connection.recv, None):
+        try:
+            reply = (True, func(*args))
+        except Exception as exc: # pylint: disable=broad-except
+            reply = (False, exc)
+        try:
+            connection.send(reply)
+        except Exception as exc: # pylint: disable=broad-except
+            connection.send((False, RuntimeError("cannot send back the result: {}".format(exc))))
+
+class _Worker():
+    """A worker process, with the task it is running (index and args) and since when."""
+
+    def __init__(self, context, func):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(func, child), daemon=True)
+        self.process.start()
+        child.close() # so that the death of the worker is seen as the end of the pipe
+        self.task = None
+        self.started = None
+
+    def run(self, index, args):
+        self.connection.send(args)
+        self.task, self.started = (index, args), time.monotonic()
+
+    def stop(self):
+        self.process.terminate()
+        self.process.join()
+        self.connection.close()
+
+def imap_ordered(func, tasks, workers=None, timeout=None):
+    """Apply func(*args) to each args tuple of tasks in a process pool and yield (args, result, error),
+    in the same order of the tasks. Only a few tasks per worker are read in advance, so tasks can be
+    a generator reading the files one at a time.
+
+    :param workers: number of processes (default: number of cores)
+    :param timeout: max seconds for each task, from when it starts: then the worker is terminated (and replaced),
+        and the error of the task is a TimeoutError. The error of a task whose worker died (e.g., killed when out
+        of memory) is a RuntimeError.
+    """
+    workers = workers or os.cpu_count() or 1
+    context = multiprocessing.get_context()
+    tasks = iter(tasks)
+    waiting = deque() # (index, args) read but not started yet
+    finished = {} # index -> (args, result, error), until it is its turn
+    counter = itertools.count()
+    read = done = 0 # tasks read, and yielded
+    pool = []
+
+    def replace(worker):
+        worker.stop()
+        pool[pool.index(worker)] = _Worker(context, func)
+
+    try:
+        pool.extend(_Worker(context, func) for _ in range(workers))
+        while True:
+            while read - done < 2 * workers: # read a few tasks ahead
+                args = next(tasks, None)
+                if args is None:
+                    break
+                waiting.append((next(counter), args))
+                read += 1
+            for worker in pool:
+                if worker.task is None and waiting:
+                    worker.run(*waiting.popleft())
+            if done in finished:
+                yield finished.pop(done)
+                done += 1
+                continue
+            if done == read:
+                return
+
+            busy = [worker for worker in pool if worker.task is not None]
+            wait_seconds = None
+            if timeout is not None:
+                wait_seconds = max(0, min(worker.started for worker in busy) + timeout - time.monotonic())
+            ready = wait([worker.connection for worker in busy], wait_seconds)
+            for worker in busy:
+                (index, args), error = worker.task, None
+                if worker.connection in ready:
+                    try:
+                        success, value = worker.connection.recv()
+                    except EOFError:
+                        worker.process.join()
+                        error = RuntimeError("worker process died (exit code {})".format(worker.process.exitcode))
+                        replace(worker)
+                    else:
+                        finished[index] = (args, value, None) if success else (args, None, value)
+                        worker.task = None
+                        continue
+                elif timeout is not None and time.monotonic() - worker.started > timeout:
+                    error = TimeoutError("task not completed in {} seconds".format(timeout))
+                    replace(worker) # the task may be stuck: its worker is not reused
+                else:
+                    continue
+                finished[index] = (args, None, error)
+    finally: # also if the caller stops early
+        for worker in pool:
+            worker.stop()
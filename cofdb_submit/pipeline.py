@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+"""Processing of a new framework, shared by the web form and the batch script:
+parse the CIF, relabel the axes, detect the dimensionality, replicate 2D COFs, and write the files.
+"""
+
+import os
+import re
+from data import FRAMEWORKS_FILE, CIFS_FOLDER
+from analysis_cache import ANALYSIS_CACHE
+from structure import viewer_script
+from ids import ID_INDEX
+from dimensionality import classify_dimensionality
+from fingerprints import fingerprint
+from transforms import permute_axes, replicate_cell
+from timing import stage
+
+PIPELINE_VERSION = 4 # increase when the results of analyze_cif change, to invalidate the cache
+MAX_UPLOAD_MB = float(os.environ.get('COFDB_MAX_UPLOAD_MB', 100)) # larger CIF files are refused
+
+def cif_size(cif):
+    """Bytes of the CIF: cif is its content (bytes) or the path of the file (os.PathLike)."""
+    return os.path.getsize(cif) if isinstance(cif, os.PathLike) else len(cif)
+
+def check_cif_size(nbytes):
+    """Raise a ValueError with a clear message if the CIF file is above COFDB_MAX_UPLOAD_MB."""
+    if nbytes > MAX_UPLOAD_MB * 1024**2:
+        raise ValueError("ERROR: the CIF file is {:.3g} MB, above the limit of {:g} MB (COFDB_MAX_UPLOAD_MB)."
+                         .format(nbytes / 1024**2, MAX_UPLOAD_MB))
+
+def save_upload(content):
+    """Write the uploaded CIF (bytes) to a temporary file, for a worker process to read it from disk instead of
+    receiving a copy through the pipe: return its path, to delete when the job is done.
+    """
+    import tempfile
+    from pathlib import Path
+
+    handle, path = tempfile.mkstemp(prefix='cofdb_upload_', suffix='.cif')
+    with os.fdopen(handle, 'wb') as tmp:
+        tmp.write(content)
+    return Path(path)
+
+def open_cif(cif):
+    """File object to parse the CIF without copying it: cif is its content (bytes or str)
+    or the path of the file (os.PathLike).
+    """
+    from io import BytesIO, StringIO
+
+    if isinstance(cif, os.PathLike):
+        return open(cif, 'rb')
+    if isinstance(cif, str):
+        return StringIO(cif)
+    return BytesIO(cif) # shares the buffer of the bytes, instead of copying it
+
+def parse_cif(cif, relabel=None, replicate=False):
+    """Load the CIF, unwrap it to P1 using ASE, and extract some info.
+
+    :param cif: content of the CIF file (bytes or str), or its path (os.PathLike)
+    :param relabel: None, 'cab' or 'bca', to relabel the cell vectors abc
+        (if None, the relabel needed to have the layers of a 2D COF on the ab plane is applied automatically)
+    :param replicate: force the framework to be 2D and replicate it 2x in C direction
+    :return: dictionary with the ASE atoms (and the supercell made of them), the dimensionality intervals found
+        by ASE (only if the fast classification was ambiguous), the relabel applied, and the elements,
+        dimensionality and modifications guessed
+    """
+    from ase.io import read
+
+    with stage('read_cif', bytes=cif_size(cif)) as info, open_cif(cif) as handle:
+        atoms = read(handle, format='cif')
+        info['atoms'] = len(atoms)
+
+    formula = atoms.get_chemical_formula()
+    elements = [e for e in re.split(r'\d+', formula) if e]
+    result = {
+        'elements': ",".join(elements),
+        'dimensionality': None,
+        'modifications': 'none',
+        'intervals': None,
+        'relabel': relabel,
+        'supercell': (1, 1, 1),
+    }
+
+    # If the user selects the proper relabel, rotate the cell
+    if relabel is not None:
+        print("USER CHOICE: relabel cell vectors to {}".format(relabel.upper()))
+        permute_axes(atoms, relabel)
+
+    # If the 2x replication was chosen go with that, otherwise check first if there is the need
+    # NOTE: this is usefull because sometime the layers are close by and ASE recognizes it as a 3D frameworks,
+    #       but you want to force the choice of assuming it is a 2D COF and need 2 layers
+
+    if replicate:
+        print("USER CHOICE: force the frameworks to be 2D and duplicate 2x in C direction")
+        result['dimensionality'] = '2D'
+        with stage('replicate_cell'):
+            atoms = replicate_cell(atoms, (1, 1, 2))
+        result['modifications'] = 'replicated 2x in C direction'
+        result['supercell'] = (1, 1, 2)
+    else:
+        with stage('dimensionality') as info:
+            classification = classify_dimensionality(atoms)
+            info['method'] = classification['method']
+        result['intervals'] = classification['intervals']
+        if classification['dimtype'] == '2D':
+            result['dimensionality'] = '2D'
+
+            # Relabel the axes if the layers are not on the XY plane and the user did not choose already
+            normal = classification['normal']
+            if relabel is None and classification['relabel'] is not None:
+                print("AUTO: relabel cell vectors to {}".format(classification['relabel'].upper()))
+                permute_axes(atoms, classification['relabel'])
+                result['relabel'] = classification['relabel']
+                normal = 2
+
+            # Check if it is correcly oriented, and extend to two layers if onyly one is present
+            z_min_thr = 6 #if less, it is likely a single layer
+            cell_lengths = atoms.cell.cellpar()[0:3]
+            if classification['method'] == 'fast':
+                misoriented = normal != 2
+            else: # X or Y are perpendicular the layer
+                misoriented = cell_lengths[0] < z_min_thr or cell_lengths[1] < z_min_thr
+            if misoriented:
+                error = "ERROR: you need to rotate the axes to have the layers on XY plane."
+                if classification['relabel']:
+                    error += " Try relabel abc to {}.".format(classification['relabel'])
+                result['dimensionality'] = result['modifications'] = error
+            if cell_lengths[2] < z_min_thr: # Z is perpendicular to a single layer
+                with stage('replicate_cell'):
+                    atoms = replicate_cell(atoms, (1, 1, 2))
+                result['modifications'] = 'replicated 2x in C direction'
+                result['supercell'] = (1, 1, 2)
+        else:
+            result['dimensionality'] = '3D'
+
+    result['atoms'] = atoms
+    return result
+
+def framework_row(info):
+    """Row of cof-frameworks.csv for the framework."""
+    return [info['cof_id'], info['source'], info['name'], info['elements'], info['modifications']]
+
+def format_cif(atoms):
+    """Serialize the atoms to a CIF string, using manage_crystal for the standard formatting."""
+    from ase.io import write
+    from manage_crystal.utils import parse_and_write
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cif_path = os.path.join(tmpdir, 'crystal.cif')
+        with stage('write_cif', atoms=len(atoms)):
+            write(cif_path, atoms)
+        with stage('manage_crystal') as info:
+            parse_and_write(cif_path, cif_path)
+            with open(cif_path) as handle:
+                cif = handle.read()
+            info['chars'] = len(cif)
+        return cif
+
+def analyze_cif(cif, relabel=None, replicate=False, formatted=False):
+    """Same as parse_cif, adding the script to show the structure in JSmol ('viewer_script') and its fingerprint
+    to find duplicates ('fingerprint'), with the results cached on disk: the same file with the same options
+    is parsed only once. The key of the cache entry is returned as 'cache_key', for format_cif_cached.
+
+    :param cif: content of the CIF file (bytes), or its path (os.PathLike): it is hashed and parsed
+        without copies, and refused if above COFDB_MAX_UPLOAD_MB
+    :param formatted: add also the CIF formatted by manage_crystal ('cif'), cached in the same entry
+    """
+    import ase
+
+    check_cif_size(cif_size(cif))
+    with stage('analysis_cache') as info:
+        key = ANALYSIS_CACHE.key(cif, relabel, bool(replicate), ase.__version__, PIPELINE_VERSION)
+        result = ANALYSIS_CACHE.get(key)
+        info['hit'] = result is not None
+    store = result is None
+    if result is None:
+        result = parse_cif(cif, relabel=relabel, replicate=replicate)
+        with stage('viewer_script') as info:
+            result['viewer_script'] = viewer_script(result['atoms'], result['supercell'])
+            info['chars'] = len(result['viewer_script'])
+        with stage('fingerprint', atoms=len(result['atoms'])):
+            result['fingerprint'] = fingerprint(result['atoms'])
+    if formatted and 'cif' not in result:
+        result['cif'] = format_cif(result['atoms'])
+        store = True
+    if store:
+        with stage('cache_store'):
+            ANALYSIS_CACHE.set(key, result)
+    result['cache_key'] = key
+    return result
+
+def format_cif_cached(key, atoms):
+    """format_cif of the atoms analyzed by analyze_cif, cached in its entry (key is its 'cache_key')."""
+    with stage('analysis_cache') as info:
+        result = ANALYSIS_CACHE.get(key)
+        info['hit'] = result is not None and 'cif' in result
+    if result is not None and 'cif' in result:
+        return result['cif']
+    cif = format_cif(atoms)
+    if result is not None: # otherwise evicted meanwhile
+        result['cif'] = cif
+        with stage('cache_store'):
+            ANALYSIS_CACHE.set(key, result)
+    return cif
+
+def process_cif(cif, relabel=None, replicate=False):
+    """All the work on a CIF file that does not need the framework ID: parse it and format the output CIF
+    (both cached). Everything is returned in a (picklable) dictionary, so it can run in a worker process.
+    """
+    result = analyze_cif(cif, relabel=relabel, replicate=replicate, formatted=True)
+    result['natoms'] = len(result['atoms'])
+    return result
+
+class CifFiles():
+    """Formatted CIF files to add to the cifs/ folder: they are written to temporary files of the folder, and moved
+    to their place only after their rows are committed to cof-frameworks.csv (if a write or the commit fails, or the
+    process dies meanwhile, no CIF file is left without its row). Use it around the transaction:
+
+        with CifFiles() as files, ID_INDEX.transaction(FRAMEWORKS_FILE) as rows:
+    """
+
+    def __init__(self):
+        self.pending = {} # temporary path -> path of the CIF file
+
+    def write(self, cof_id, cif):
+        """Write the CIF of the framework to a temporary file: return the path it will have."""
+        import tempfile
+
+        cif_path = os.path.join(CIFS_FOLDER, cof_id + '.cif')
+        handle, tmp_path = tempfile.mkstemp(dir=CIFS_FOLDER, prefix='.{}-'.format(cof_id), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'w') as tmp:
+                tmp.write(cif)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.pending[tmp_path] = cif_path
+        return cif_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Move the files to their place, or delete them if the block failed."""
+        for tmp_path, cif_path in self.pending.items():
+            if exc_type is None:
+                print("Writing {}".format(cif_path))
+                os.replace(tmp_path, cif_path)
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.pending = {}
+
+def write_framework(info, cif):
+    """Add framework to list and add the formatted CIF file to cifs/ folder: info has also the paper ID ('paper_id').
+    If meanwhile the framework ID was taken (e.g., by another session), a new one is minted and set in info.
+    """
+    with stage('write_framework'), CifFiles() as files, ID_INDEX.transaction(FRAMEWORKS_FILE) as rows:
+        if ID_INDEX.has_framework(info['cof_id']):
+            cof_id = ID_INDEX.mint_cof_id(info['paper_id'], info['charge'], info['dimensionality'][0], reserve=True)
+            print("WARNING: {} was already taken, using {}".format(info['cof_id'], cof_id))
+            info['cof_id'] = cof_id
+        else:
+            ID_INDEX.add_framework(info['cof_id'], info['paper_id']) # not to guess its paper from the ID
+        rows.append(framework_row(info))
+        print(rows[-1])
+        return files.write(info['cof_id'], cif)
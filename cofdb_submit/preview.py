@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""Static preview of a structure (PNG or SVG), rendered on the server with matplotlib: shown in the form for the
+frameworks too large for JSmol in the browser, and usable without a browser (e.g., to check the layers in CI).
+
+To render the preview of a CIF file from the command line:
+    python cofdb_submit/preview.py structure.cif --axis c a --output-dir previews/
+"""
+
+import os
+import hashlib
+import argparse
+import itertools
+from io import BytesIO
+import numpy as np
+
+from data import CACHE_FOLDER
+from analysis_cache import AnalysisCache
+
+PREVIEW_MAX_ATOMS = int(os.environ.get('COFDB_PREVIEW_ATOMS', 5000)) # above, the form shows the preview first
+PREVIEW_SIZE = (600, 400) # pixels, as the JSmol applet
+PREVIEW_VERSION = 1 # increase when the rendering changes, to invalidate the cache
+RADIUS_SCALE = 0.5 # of the covalent radii, to see the bonds between the atoms
+
+PREVIEW_CACHE = AnalysisCache(os.path.join(CACHE_FOLDER, 'previews'),
+                              max_bytes=int(float(os.environ.get('COFDB_PREVIEW_CACHE_MB', 100)) * 1024**2))
+
+def structure_hash(atoms):
+    """Hash of the elements, positions and cell of the atoms."""
+    sha = hashlib.sha256()
+    for array in (atoms.numbers, atoms.positions, np.array(atoms.cell)):
+        sha.update(np.ascontiguousarray(array).tobytes())
+    return sha.hexdigest()
+
+def projection(cell, axis):
+    """Rows (right, up, towards the viewer) of the view along the cell vector axis ('a', 'b' or 'c'),
+    i.e., perpendicular to the plane of the other two vectors: along c, the layers of a 2D COF are seen from above.
+    """
+    index = 'abc'.index(axis)
+    first, second = cell[(index + 1) % 3], cell[(index + 2) % 3]
+    normal = np.cross(first, second)
+    normal /= np.linalg.norm(normal)
+    right = first - first @ normal * normal
+    right /= np.linalg.norm(right)
+    return np.array([right, np.cross(normal, right), normal])
+
+def render(atoms, axis='c', size=PREVIEW_SIZE, fmt='png'):
+    """Image of the atoms (and of the cell) projected along the axis: return its bytes."""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from ase.data import covalent_radii
+    from ase.data.colors import jmol_colors
+
+    cell = np.array(atoms.cell)
+    basis = projection(cell, axis)
+    xyz = atoms.positions @ basis.T
+    order = np.argsort(xyz[:, 2]) # the atoms at the front are drawn last
+    corners = np.array(list(itertools.product([0, 1], repeat=3))) @ cell @ basis.T
+    edges = [(i, j) for i, j in itertools.combinations(range(8), 2) if bin(i ^ j).count('1') == 1]
+
+    points = np.vstack([xyz[:, :2], corners[:, :2]])
+    low, high = points.min(axis=0) - 2, points.max(axis=0) + 2 # Angstrom of margin
+    scale = min(size[0] / (high - low)[0], size[1] / (high - low)[1]) # pixels per Angstrom
+    center = (low + high) / 2
+
+    fig = Figure(figsize=(size[0] / 100, size[1] / 100), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_axis_off()
+    ax.set_xlim(center[0] - size[0] / scale / 2, center[0] + size[0] / scale / 2)
+    ax.set_ylim(center[1] - size[1] / scale / 2, center[1] + size[1] / scale / 2)
+    for i, j in edges:
+        ax.plot(corners[[i, j], 0], corners[[i, j], 1], color='0.5', linewidth=0.8)
+    diameters = 2 * RADIUS_SCALE * covalent_radii[atoms.numbers[order]] * scale * 0.72 # points, at 100 dpi
+    ax.scatter(xyz[order, 0], xyz[order, 1], s=diameters ** 2, c=jmol_colors[atoms.numbers[order]],
+               edgecolors='0.2', linewidths=0.2)
+    handle = BytesIO()
+    fig.savefig(handle, format=fmt)
+    return handle.getvalue()
+
+def preview(atoms, axis='c', size=PREVIEW_SIZE, fmt='png'):
+    """Same as render, with the images cached on disk by the hash of the structure."""
+    key = PREVIEW_CACHE.key(structure_hash(atoms).encode(), axis, tuple(size), fmt, PREVIEW_VERSION)
+    image = PREVIEW_CACHE.get(key)
+    if image is None:
+        image = render(atoms, axis, size, fmt)
+        PREVIEW_CACHE.set(key, image)
+    return image
+
+def main(argv=None):
+    from ase.io import read
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('cifs', nargs='+', help='CIF files')
+    parser.add_argument('--axis', nargs='+', choices=['a', 'b', 'c'], default=['c'], help='view along these axes')
+    parser.add_argument('--format', choices=['png', 'svg'], default='png')
+    parser.add_argument('--size', type=int, nargs=2, default=list(PREVIEW_SIZE), help='width and height (pixels)')
+    parser.add_argument('--output-dir', default='.', help='folder for the images, named as FILE-AXIS.FORMAT')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for path in args.cifs:
+        atoms = read(path, format='cif')
+        for axis in args.axis:
+            output = os.path.join(args.output_dir, '{}-{}.{}'.format(
+                os.path.splitext(os.path.basename(path))[0], axis, args.format))
+            with open(output, 'wb') as handle:
+                handle.write(preview(atoms, axis, args.size, args.format))
+            print("{}: {} atoms, view along {} saved in {}".format(path, len(atoms), axis, output))
+
+if __name__ == '__main__':
+    main()
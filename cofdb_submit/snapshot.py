@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+"""SQLite snapshot of cof-papers.csv and cof-frameworks.csv, with indexed lookups.
+
+The CSV files stay the source of truth: the snapshot is derived from them, in the cache folder, and it is
+refreshed at every access by parsing only the rows appended since the last refresh.
+To build (or refresh) it from the command line:
+    python cofdb_submit/snapshot.py
+"""
+
+import os
+import csv
+import sqlite3
+import hashlib
+import threading
+from io import StringIO
+
+from data import CURATED_COFS, PAPERS_FILE, FRAMEWORKS_FILE, CACHE_FOLDER
+from analysis_cache import CHUNK_BYTES
+
+SNAPSHOT_VERSION = 3 # increase when the schema changes: the snapshot is built again in a new file
+SNAPSHOT_FILE = os.path.join(CACHE_FOLDER, 'snapshot-{}-v{}.sqlite'.format(
+    hashlib.sha1(CURATED_COFS.encode()).hexdigest()[:8], SNAPSHOT_VERSION))
+
+# table -> {CSV column: SQL column}
+TABLES = {
+    'papers': {'CURATED-COFs paper ID': 'paper_id', 'Reference': 'reference', 'DOI': 'doi', 'Title': 'title'},
+    'frameworks': {'CURATED-COFs ID': 'cof_id', 'Source': 'source', 'Name': 'name', 'Elements': 'elements',
+                   'Modifications': 'modifications'},
+}
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    path TEXT PRIMARY KEY, generation INTEGER, inode INTEGER, mtime_ns INTEGER, size INTEGER,
+    offset INTEGER, digest BLOB, header TEXT);
+CREATE TABLE IF NOT EXISTS papers (row INTEGER PRIMARY KEY, paper_id TEXT, reference TEXT, doi TEXT, title TEXT);
+CREATE TABLE IF NOT EXISTS frameworks (row INTEGER PRIMARY KEY, cof_id TEXT, source TEXT, name TEXT,
+    elements TEXT, modifications TEXT);
+"""
+# table -> indexed columns (dropped during a full reload, as building them at the end is faster)
+INDEXES = {
+    'papers': ['paper_id', 'doi'],
+    'frameworks': ['cof_id', 'modifications'],
+}
+
+class Snapshot():
+    """The snapshot of the CSV tables, in a SQLite file shared by all the processes (server and scripts).
+
+    A table is refreshed incrementally if its file was only appended (same inode, larger size, same SHA-256 of
+    all the bytes already loaded), otherwise it is loaded again and its generation is increased: an edit anywhere
+    in the file (e.g., a DOI corrected by hand) is always picked up.
+    Only complete lines are loaded, so a row being written by another process is loaded at the next refresh.
+    """
+
+    def __init__(self, path, files):
+        self.path = path
+        self.files = files # CSV path -> table
+        self._lock = threading.RLock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False,
+                                               isolation_level=None) # transactions handled explicitly
+            self._connection.executescript(SCHEMA)
+            for table in TABLES:
+                self._create_indexes(self._connection, table)
+        return self._connection
+
+    @staticmethod
+    def _create_indexes(db, table):
+        for column in INDEXES[table]:
+            db.execute("CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({1})".format(table, column))
+
+    def _insert(self, db, table, header, lines, start):
+        """Insert the CSV lines (text without the header) as rows start, start + 1, ..."""
+        names = TABLES[table]
+        columns = ['row'] + [names[h] for h in header if h in names]
+        positions = [i for i, h in enumerate(header) if h in names]
+        rows = []
+        for values in csv.reader(StringIO(lines)):
+            if len(values) < len(header): # e.g., empty lines
+                if not values:
+                    continue
+                values += [None] * (len(header) - len(values))
+            rows.append([start + len(rows)] + [values[i] for i in positions])
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(table, ", ".join(columns), ", ".join("?" * len(columns)))
+        db.executemany(sql, rows)
+        return len(rows)
+
+    def refresh(self, csv_path):
+        """Load the rows of the CSV file not in the snapshot yet (or all of them, if the file changed)."""
+        stat = os.stat(csv_path)
+        with self._lock:
+            db = self._connect()
+            if self._unchanged(db, csv_path, stat):
+                return # without opening a transaction
+            db.execute("BEGIN IMMEDIATE") # one process at a time
+            try:
+                self._refresh(db, csv_path)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _meta(db, csv_path):
+        return db.execute("SELECT generation, inode, mtime_ns, size, offset, digest, header FROM meta "
+                          "WHERE path = ?", (csv_path,)).fetchone()
+
+    def _unchanged(self, db, csv_path, stat):
+        meta = self._meta(db, csv_path)
+        return meta is not None and meta[1:4] == (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def _refresh(self, db, csv_path):
+        table = self.files[csv_path]
+        with open(csv_path, 'rb') as handle:
+            stat = os.fstat(handle.fileno())
+            if self._unchanged(db, csv_path, stat): # another process may have refreshed it meanwhile
+                return
+            generation, inode, _, _, offset, digest, header = self._meta(db, csv_path) or (-1, None, 0, 0, 0, b'', '')
+            sha = hashlib.sha256()
+            appended = inode == stat.st_ino and stat.st_size >= offset > 0
+            if appended: # the rows already loaded did not change
+                for chunk in iter(lambda: handle.read(min(CHUNK_BYTES, offset - handle.tell())), b''):
+                    sha.update(chunk)
+                appended = sha.digest() == digest
+            if appended:
+                start = db.execute("SELECT COUNT(*) FROM {}".format(table)).fetchone()[0]
+            else:
+                generation += 1
+                db.execute("DELETE FROM {}".format(table))
+                for column in INDEXES[table]:
+                    db.execute("DROP INDEX IF EXISTS {}_{}".format(table, column))
+                handle.seek(0)
+                line = handle.readline()
+                sha, header = hashlib.sha256(line), line.decode()
+                offset, start = handle.tell(), 0
+            data = handle.read()
+            data = data[:data.rfind(b'\n') + 1] # only complete lines
+            offset += len(data)
+            sha.update(data)
+            digest = sha.digest() # of the bytes loaded, i.e., [0:offset]
+
+        self._insert(db, table, next(csv.reader([header])), data.decode(), start)
+        self._create_indexes(db, table)
+        db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                   (csv_path, generation, stat.st_ino, stat.st_mtime_ns, stat.st_size, offset, digest, header))
+
+    def _query(self, csv_path, sql, params=()):
+        with self._lock:
+            self.refresh(csv_path)
+            return self._connect().execute(sql, params).fetchall()
+
+    def generation(self, csv_path):
+        """Counter of the full reloads of the table, to know if derived data needs to be rebuilt."""
+        return self._query(csv_path, "SELECT generation FROM meta WHERE path = ?", (csv_path,))[0][0]
+
+    def count(self, csv_path):
+        return self._query(csv_path, "SELECT COUNT(*) FROM {}".format(self.files[csv_path]))[0][0]
+
+    def rows(self, csv_path, columns, start=0):
+        """Values of the columns (SQL names) of the rows from start on, in the order of the CSV file."""
+        return self._query(csv_path, "SELECT {} FROM {} WHERE row >= ? ORDER BY row".format(
+            ", ".join(columns), self.files[csv_path]), (start,))
+
+    def paper(self, paper_id):
+        """Row of the paper as a dictionary (SQL names), or None."""
+        found = self._query(PAPERS_FILE, "SELECT paper_id, reference, doi, title FROM papers WHERE paper_id = ?",
+                            (paper_id,))
+        return dict(zip(['paper_id', 'reference', 'doi', 'title'], found[0])) if found else None
+
+    def paper_of_doi(self, doi):
+        """Paper ID of the DOI, or None if not present."""
+        found = self._query(PAPERS_FILE, "SELECT paper_id FROM papers WHERE doi = ? ORDER BY row LIMIT 1", (doi,))
+        return found[0][0] if found else None
+
+    def framework(self, cof_id):
+        """Row of the framework as a dictionary (SQL names), or None."""
+        columns = ['cof_id', 'source', 'name', 'elements', 'modifications']
+        found = self._query(FRAMEWORKS_FILE, "SELECT {} FROM frameworks WHERE cof_id = ?".format(", ".join(columns)),
+                            (cof_id,))
+        return dict(zip(columns, found[0])) if found else None
+
+    def modifications(self):
+        """All the different modifications of the frameworks, sorted."""
+        return [m for m, in self._query(
+            FRAMEWORKS_FILE, "SELECT DISTINCT modifications FROM frameworks WHERE modifications IS NOT NULL "
+                             "AND modifications != '' ORDER BY modifications")]
+
+SNAPSHOT = Snapshot(SNAPSHOT_FILE, {PAPERS_FILE: 'papers', FRAMEWORKS_FILE: 'frameworks'})
+
+def get_modifications_options():
+    """Options for the modifications of the frameworks, for all the sessions (indexed in the snapshot)."""
+    try:
+        return SNAPSHOT.modifications()
+    except FileNotFoundError:
+        raise FileNotFoundError("ERROR: cof-frameworks.csv not found... check the README!")
+
+if __name__ == '__main__':
+    for csv_path in SNAPSHOT.files:
+        SNAPSHOT.refresh(csv_path)
+        print("{}: {} rows (generation {})".format(csv_path, SNAPSHOT.count(csv_path), SNAPSHOT.generation(csv_path)))
+    print("Snapshot saved in {}".format(SNAPSHOT.path))
@@ -1,5 +1,12 @@
 # -*- coding: utf-8 -*-
 # pylint: disable=unsubscriptable-object, too-many-locals
+import os
+
+# URL of a self-hosted JSmol (e.g., /jsmol, set by serve.py when the files are present), instead of the remote one
+JSMOL_URL = os.environ.get('JSMOL_URL', '').rstrip('/')
+JSMOL_REMOTE_URL = "https://chemapps.stolaf.edu/jmol/jsmol"
+# above this number of atoms, the hydrogens are not sent to the viewer
+VIEWER_MAX_ATOMS = int(os.environ.get('COFDB_VIEWER_MAX_ATOMS', 20000))
 
 def structure_jsmol(script_source):
     from jsmol_bokeh_extension import JSMol
@@ -7,12 +14,13 @@ def structure_jsmol(script_source):
 
     # script_source = bmd.ColumnDataSource()
 
+    jsmol_url = JSMOL_URL or JSMOL_REMOTE_URL
     info = dict(
         height="100%",
         width="100%",
         use="HTML5",
-        serverURL="https://chemapps.stolaf.edu/jmol/jsmol/php/jsmol.php",
-        j2sPath="https://chemapps.stolaf.edu/jmol/jsmol/j2s",
+        serverURL=jsmol_url + "/php/jsmol.php",
+        j2sPath=jsmol_url + "/j2s",
         #serverURL="https://www.materialscloud.org/discover/scripts/external/jsmol/php/jsmol.php",
         #j2sPath="https://www.materialscloud.org/discover/scripts/external/jsmol/j2s",
         #serverURL="detail/static/jsmol/php/jsmol.php",
@@ -24,12 +32,60 @@ def structure_jsmol(script_source):
         #""".format(get_cif_url(entry.filename))
     )
 
+    kwargs = {'js_url': JSMOL_URL + "/JSmol.min.js"} if JSMOL_URL else {}
     applet = JSMol(
         width=600,
         height=400,
         script_source=script_source,
         info=info,
-        #js_url="detail/static/jsmol/JSmol.min.js",
+        **kwargs,
     )
 
     return applet
+
+def jsmol_script(cif_str, lattice=(1, 1, 1)):
+    """Script to load a CIF string in JSmol, which applies the symmetry and replicates the cell as in lattice."""
+    return """set defaultLattice {{{} {} {}}};
+load data "cifstring"
+{}
+end "cifstring"
+""".format(*lattice, cif_str)
+
+def viewer_script(atoms, supercell=(1, 1, 1), max_atoms=VIEWER_MAX_ATOMS):
+    """Compact script to show the atoms in JSmol: a minimal P1 CIF with 4 decimals, as the view does not need more.
+    A supercell (e.g., (1, 1, 2)) made with replicate_cell (transforms.py) or make_supercell is sent as its
+    first cell, replicated by JSmol.
+    """
+    import numpy as np
+
+    supercell = tuple(int(n) for n in supercell)
+    atoms = atoms[:len(atoms) // int(np.prod(supercell))] # both keep the atoms of the first cell first
+    atoms.set_cell(atoms.cell / np.array(supercell)[:, None])
+    if len(atoms) > max_atoms:
+        atoms = atoms[atoms.numbers != 1]
+    symbols = atoms.get_chemical_symbols()
+    frac = atoms.get_scaled_positions()
+
+    lines = ["data_view"]
+    lines += ["_cell_{} {:.4f}".format(name, value) for name, value in zip(
+        ['length_a', 'length_b', 'length_c', 'angle_alpha', 'angle_beta', 'angle_gamma'], atoms.cell.cellpar())]
+    lines += ["_symmetry_space_group_name_H-M 'P 1'", "loop_", "_atom_site_type_symbol",
+              "_atom_site_fract_x", "_atom_site_fract_y", "_atom_site_fract_z"]
+    lines += ["{} {:.4f} {:.4f} {:.4f}".format(s, x, y, z) for s, (x, y, z) in zip(symbols, frac)]
+    return jsmol_script("\n".join(lines), lattice=supercell)
+
+def read_structure(cif_str):
+    """Read the CIF string with ASE, unwrapping the symmetry, and return the atoms and the script to show them:
+    the CIF itself, as JSmol applies the symmetry, unless the atoms are too many to unwrap them client-side.
+    """
+    from ase.io import read
+    from io import StringIO
+    from timing import stage
+
+    with stage('read_cif') as info:
+        atoms = read(StringIO(cif_str), format='cif')
+        info['atoms'] = len(atoms)
+    with stage('viewer_script') as info:
+        script = viewer_script(atoms) if len(atoms) > VIEWER_MAX_ATOMS else jsmol_script(cif_str)
+        info['chars'] = len(script)
+    return atoms, script
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+"""Per-stage timing of the callbacks: printed, shown in the forms, and appended as JSON lines to COFDB_TIMING_LOG.
+Set COFDB_PROFILE=cprofile (or pyinstrument, if installed) to also profile each callback: the profiles are
+saved in COFDB_PROFILE_DIR.
+"""
+
+import os
+import json
+import time
+import datetime
+import tempfile
+import threading
+import contextlib
+
+TIMING_LOG = os.environ.get('COFDB_TIMING_LOG')
+PROFILER = os.environ.get('COFDB_PROFILE', '').lower()
+PROFILE_DIR = os.environ.get('COFDB_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'cofdb_profiles'))
+SESSION_TARGET_MS = float(os.environ.get('COFDB_SESSION_TARGET_MS', 300)) # to build the page of a new session
+
+_LOG_LOCK = threading.Lock()
+_ACTIVE = threading.local() # timer of the callback running in this thread, for stage()
+
+def _start_profiler():
+    try:
+        if PROFILER == 'cprofile':
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        if PROFILER == 'pyinstrument':
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    except (ImportError, ValueError, RuntimeError) as exc: # e.g., not installed, or another profiler running
+        print("WARNING: cannot profile with {} ({})".format(PROFILER, exc))
+    return None
+
+def _stop_profiler(profiler, name):
+    """Save the profile and return its path (None if it cannot be saved)."""
+    if PROFILER == 'cprofile':
+        profiler.disable()
+    else:
+        profiler.stop()
+    path = os.path.join(PROFILE_DIR, '{}-{}'.format(name, datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')))
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if PROFILER == 'cprofile':
+            path += '.prof' # e.g., python -m pstats path, or snakeviz path
+            profiler.dump_stats(path)
+        else:
+            path += '.html'
+            with open(path, 'w') as handle:
+                handle.write(profiler.output_html())
+    except OSError as exc:
+        print("WARNING: cannot save the profile in {} ({})".format(PROFILE_DIR, exc))
+        return None
+    return path
+
+class Timer():
+    """Timing of a callback and of its stages. Usage example:
+
+        with Timer('on_click_parse', file=filename) as timer:
+            with timer.stage('read', bytes=len(content)) as info:
+                atoms = read(...)
+                info['atoms'] = len(atoms)
+
+    Inside the block, stage() times the stages also in the functions called (e.g., in pipeline.py).
+    The total time starts when the timer is created: for async callbacks, create it when the work is submitted,
+    and enter it when the result arrives.
+    """
+
+    def __init__(self, name, **info):
+        self.name = name
+        self.info = info
+        self.stages = []
+        self.seconds = None
+        self.error = None
+        self._start = time.perf_counter()
+        self._previous = None
+        self._profiler = None
+
+    def elapsed(self):
+        """Seconds since the timer was created."""
+        return time.perf_counter() - self._start
+
+    def add(self, name, seconds, **info):
+        """Add a stage timed elsewhere (e.g., in another thread)."""
+        self.stages.append(dict(stage=name, seconds=seconds, **info))
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        """Time the block: more info (e.g., number of atoms, bytes) can be added to the yielded dictionary."""
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.add(name, time.perf_counter() - start, **info)
+
+    def __enter__(self):
+        self._previous = getattr(_ACTIVE, 'timer', None)
+        _ACTIVE.timer = self
+        if PROFILER and self._previous is None:
+            self._profiler = _start_profiler()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        _ACTIVE.timer = self._previous
+        if exc is not None:
+            self.error = "{}: {}".format(exc_type.__name__, exc)
+        if self._profiler is not None:
+            self.info['profile'] = _stop_profiler(self._profiler, self.name)
+        self.finish()
+        return False
+
+    def finish(self):
+        """Stop the timer, print the summary and log the record."""
+        self.seconds = self.elapsed()
+        print("TIMING " + self.summary())
+        if TIMING_LOG:
+            record = dict(self.info, time=datetime.datetime.now().isoformat(timespec='milliseconds'),
+                          callback=self.name, seconds=self.seconds, stages=self.stages, error=self.error)
+            with _LOG_LOCK, open(TIMING_LOG, 'a') as handle:
+                handle.write(json.dumps(record, default=str) + '\n')
+
+    def summary(self, separator=', '):
+        """E.g., 'on_click_parse 1.234 s: read 0.100 s (atoms=2048), ...'."""
+        stages = []
+        for entry in self.stages:
+            extra = ", ".join("{}={}".format(k, v) for k, v in entry.items() if k not in ('stage', 'seconds'))
+            stages.append("{} {:.3f} s{}".format(entry['stage'], entry['seconds'],
+                                                 " ({})".format(extra) if extra else ""))
+        total = "{:.3f} s".format(self.seconds) if self.seconds is not None else "running"
+        return "{} {}{}{}{}".format(self.name, total, " ERROR" if self.error else "", ": " if stages else "",
+                                    separator.join(stages))
+
+@contextlib.contextmanager
+def stage(name, **info):
+    """Time the block as a stage of the timer of the callback running in this thread, if any."""
+    timer = getattr(_ACTIVE, 'timer', None)
+    if timer is None:
+        yield info
+    else:
+        with timer.stage(name, **info) as info:
+            yield info
+
+@contextlib.contextmanager
+def collect_stages():
+    """Collect the stages timed with stage() in the block (e.g., in a worker process, without the timer of the
+    callback): yield their list, to add them to the timer later.
+    """
+    timer = Timer('collect_stages')
+    previous = getattr(_ACTIVE, 'timer', None)
+    _ACTIVE.timer = timer
+    try:
+        yield timer.stages
+    finally:
+        _ACTIVE.timer = previous
+
+def report_session(name, started):
+    """Print the time to build the page of a new session of the app since started (time.perf_counter()),
+    with a warning if above COFDB_SESSION_TARGET_MS.
+    """
+    session_ms = 1000 * (time.perf_counter() - started)
+    print("Session of {} built in {:.0f} ms (target: {:.0f} ms){}".format(
+        name, session_ms, SESSION_TARGET_MS, " WARNING: too slow!" if session_ms > SESSION_TARGET_MS else ""))
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""Transformations of the cell of a framework, working directly on the arrays of the ASE atoms:
+relabel of the cell vectors, and replication along them.
+"""
+
+import numpy as np
+
+AXES = 'abc'
+CYCLIC_RELABELS = ('abc', 'bca', 'cab') # the other ones flip the handedness of the cell, mirroring the structure
+
+def permute_axes(atoms, relabel):
+    """Relabel the cell vectors abc of the atoms as 'cab' or 'bca' (in place), e.g., for 'cab' the new a is the old c.
+
+    The atoms do not move: the fractional coordinates are permuted as the cell vectors, and the Cartesian
+    positions stay the same, so the arrays of the atoms are not touched.
+    """
+    if relabel not in CYCLIC_RELABELS:
+        raise ValueError("Unknown relabel '{}': use 'cab' or 'bca'.".format(relabel))
+    order = [AXES.index(axis) for axis in relabel]
+    atoms.set_cell(atoms.cell[order], scale_atoms=False)
+    atoms.pbc = atoms.pbc[order]
+    return atoms
+
+def replicate_cell(atoms, reps):
+    """Supercell with reps (e.g., (1, 1, 2)) copies of the cell along its vectors.
+
+    As in ase.build.make_supercell, the atoms of the first cell come first (then the ones of the next cells, in the
+    same order): each array is tiled at once with broadcasting, so the cost is linear in the atoms of the supercell.
+    """
+    from ase import Atoms
+
+    reps = np.asarray(reps, dtype=int)
+    cell = np.array(atoms.cell)
+    shifts = np.indices(reps).reshape(3, -1).T @ cell # lattice translation of each copy, (0, 0, 0) first
+    supercell = Atoms(cell=cell * reps[:, None], pbc=atoms.pbc, info=dict(atoms.info))
+    for name, array in atoms.arrays.items():
+        if name == 'positions':
+            supercell.arrays[name] = (array[None, :, :] + shifts[:, None, :]).reshape(-1, 3)
+        else:
+            supercell.arrays[name] = np.tile(array, (len(shifts),) + (1,) * (array.ndim - 1))
+    return supercell
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+"""Bokeh server lifecycle hooks of parse_cif: start the workers that read the CIF files for the viewer."""
+
+import os
+import sys
+import threading
+
+COFDB_SUBMIT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cofdb_submit')
+sys.path.insert(0, COFDB_SUBMIT) # the jobs module is shared with cofdb_submit: one module for both apps
+
+from jobs import JOBS
+
+def warm_up():
+    """Import the CIF reader of ASE and start the workers with it, so that the first Parse does not wait."""
+    try:
+        import ase.io.cif # pylint: disable=unused-import
+    except Exception as exc: # pylint: disable=broad-except
+        print("WARNING: warm up failed ({}), sessions will load everything when needed.".format(exc))
+        return
+    JOBS.start(['structure', 'ase.io.cif']) # the workers import the modules meanwhile
+    print("Warm up done.")
+
+def on_server_loaded(server_context):
+    """Start the workers in a thread, to serve immediately: disable it with COFDB_WARMUP=0."""
+    if os.environ.get('COFDB_WARMUP', '1') != '0':
+        threading.Thread(target=warm_up, daemon=True).start()
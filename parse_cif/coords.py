@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""Parse the atomic coordinates copied from the Supporting Information of a paper."""
+
+import numpy as np
+
+# Columns (label, x, y, z) of each atom, for the number of columns of the line
+LAYOUTS = {
+    4: [(0, 1, 2, 3)],                # "atom_type x y z"
+    5: [(0, 2, 3, 4)],                # "atom_type element x y z"
+    8: [(0, 1, 2, 3), (4, 5, 6, 7)],  # double column "atom1 x1 y1 z1 atom2 x2 y2 z2"
+}
+
+def _clean(values):
+    """Remove the Sxx page index and the uncertainty in parentheses, e.g., '0.1234(5)S12' -> '0.1234'."""
+    values = np.char.partition(values, 'S')[..., 0]
+    return np.char.partition(values, '(')[..., 0]
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+def parse_coordinates(text):
+    """Parse all the lines at once, grouping them by number of columns.
+    Empty lines and lines with a single column (likely page numbers) are skipped silently.
+
+    :return: labels (array of str), fractional coordinates (array of shape (natoms, 3)), and the
+        diagnostics for the lines that could not be parsed, as a list of (line number, line, reason)
+    """
+    _, labels, xyz, diagnostics = parse_lines(text.splitlines())
+    return labels, xyz, diagnostics
+
+def parse_lines(lines):
+    """Same as parse_coordinates, for a list of lines, returning first the index of the line of each atom."""
+    tokens = [line.split() for line in lines]
+    ncols = np.fromiter((len(t) for t in tokens), dtype=int, count=len(tokens))
+
+    diagnostics = []
+    atoms = [] # (line number, position in the line, label, xyz)
+    for n, layouts in LAYOUTS.items():
+        rows = np.flatnonzero(ncols == n)
+        if rows.size == 0:
+            continue
+        table = np.array([tokens[i] for i in rows])
+        for position, (col_label, *cols_xyz) in enumerate(layouts):
+            values = _clean(table[:, cols_xyz])
+            try:
+                xyz = values.astype(float)
+            except ValueError:
+                xyz = np.vectorize(_to_float, otypes=[float])(values)
+            ok = np.isfinite(xyz).all(axis=1)
+            for i in rows[~ok]:
+                diagnostics.append((int(i) + 1, lines[i], "coordinates are not numbers"))
+            atoms.append((rows[ok], np.full(ok.sum(), position), table[ok, col_label], xyz[ok]))
+
+    for i in np.flatnonzero(~np.isin(ncols, [0, 1, *LAYOUTS])):
+        diagnostics.append((int(i) + 1, lines[i], "unexpected number of columns ({})".format(ncols[i])))
+
+    if not atoms:
+        return np.zeros(0, dtype=int), np.array([], dtype=str), np.zeros((0, 3)), sorted(set(diagnostics))
+    line_numbers, positions, labels, xyz = (np.concatenate(x) for x in zip(*atoms))
+    order = np.lexsort((positions, line_numbers)) # same order of the text
+    return line_numbers[order], labels[order], xyz[order], sorted(set(diagnostics))
+
+class IncrementalParser():
+    """Parse the coordinates again only in the block of lines changed since the last parse: the lines are
+    independent, so the atoms of the unchanged lines before and after it are kept.
+    After parse(), changed = (start, old_stop, new_stop) tells that the atoms [start:old_stop] of the previous
+    result were replaced by the atoms [start:new_stop].
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.line_numbers = np.zeros(0, dtype=int) # index of the line of each atom
+        self.labels = np.array([], dtype=str)
+        self.xyz = np.zeros((0, 3))
+        self.diagnostics = []
+        self.changed = (0, 0, 0)
+
+    def parse(self, text):
+        """Same as parse_coordinates(text)."""
+        lines, old = text.splitlines(), self.lines
+        common = min(len(lines), len(old))
+        before = 0
+        while before < common and lines[before] == old[before]:
+            before += 1
+        after = 0 # lines unchanged at the end
+        while after < common - before and lines[-1 - after] == old[-1 - after]:
+            after += 1
+        shift = len(lines) - len(old)
+
+        numbers, labels, xyz, diagnostics = parse_lines(lines[before:len(lines) - after])
+        head = self.line_numbers < before
+        tail = self.line_numbers >= len(old) - after
+        start, old_stop = int(head.sum()), len(self.labels) - int(tail.sum())
+        self.changed = (start, old_stop, start + len(labels))
+        self.line_numbers = np.concatenate([self.line_numbers[head], numbers + before, self.line_numbers[tail] + shift])
+        self.labels = np.concatenate([self.labels[head], labels, self.labels[tail]])
+        self.xyz = np.concatenate([self.xyz[head], xyz, self.xyz[tail]])
+        self.diagnostics = ([d for d in self.diagnostics if d[0] <= before] +
+                            [(n + before, line, reason) for n, line, reason in diagnostics] +
+                            [(n + shift, line, reason) for n, line, reason in self.diagnostics
+                             if n > len(old) - after])
+        self.lines = lines
+        return self.labels, self.xyz, self.diagnostics
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Edits of the pasted coordinates: regex replaces, with a bounded history of compact diffs to undo them."""
+
+import re
+import hashlib
+from collections import deque
+
+UNDO_DEPTH = 20 # replaces that can be undone
+DIFF_ENTRY_BYTES = 150 # about the memory of a (start, end, old) entry of a diff, besides the old text
+
+def replace_regex(text, pattern, repl):
+    """Same as re.sub(pattern, repl, text, flags=re.MULTILINE), returning also the diff to undo it:
+    a list of (start, end, old), where text[start:end] of the new text replaced old.
+    """
+    diff = []
+    shift = 0 # length difference of the new text, up to the current match
+
+    def substitute(match):
+        nonlocal shift
+        new = match.expand(repl)
+        start = match.start() + shift
+        diff.append((start, start + len(new), match.group()))
+        shift += len(new) - len(match.group())
+        return new
+
+    return re.sub(pattern, substitute, text, flags=re.MULTILINE), diff
+
+def apply_undo(text, diff):
+    """Text before the replace that returned the diff."""
+    parts, position = [], 0
+    for start, end, old in diff:
+        parts += [text[position:start], old]
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+def _digest(text):
+    return hashlib.sha1(text.encode()).digest()
+
+class EditHistory():
+    """Last replaces (up to depth), each stored as its diff and the digest of the text it produced:
+    a replace can be undone only on that same text, i.e., if the text was not edited by hand afterwards.
+    """
+
+    def __init__(self, depth=UNDO_DEPTH):
+        self.edits = deque(maxlen=depth)
+
+    def __len__(self):
+        return len(self.edits)
+
+    def replace(self, text, pattern, repl):
+        """Apply the regex replace to the text and remember how to undo it: return the new text."""
+        new, diff = replace_regex(text, pattern, repl)
+        if len(diff) * DIFF_ENTRY_BYTES > len(text): # many small matches: a copy of the old text is smaller
+            diff = [(0, len(new), text)]
+        if new != text:
+            self.edits.append((diff, _digest(new)))
+        return new
+
+    def undo(self, text):
+        """Undo the last replace on the text: return the previous text."""
+        if not self.edits:
+            raise ValueError("No replaced text backup to load!")
+        diff, digest = self.edits[-1]
+        if _digest(text) != digest:
+            self.edits.clear() # the diffs do not apply to this text anymore
+            raise ValueError("The text was edited after the last replace: it cannot be undone.")
+        self.edits.pop()
+        return apply_undo(text, diff)
@@ -1,13 +1,26 @@
 #!/usr/bin/env python
 """Add new entries to the CURATED-COFs files: cof-papers.csv and cof-frameworks.csv."""
 
+import time
+SESSION_START = time.perf_counter() # to measure the time to build the page of a new session
+
 import os
-import numpy as np
+import sys
+COFDB_SUBMIT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cofdb_submit')
+sys.path.insert(0, COFDB_SUBMIT) # structure, timing and jobs are shared with cofdb_submit: one module for both apps
 import panel as pn
-import pandas as pd
-import datetime
 import re
+from io import StringIO
 from pathlib import Path
+from structure import read_structure
+from space_groups import lookup, suggest
+from coords import IncrementalParser
+from edits import EditHistory
+from timing import Timer, report_session
+from jobs import SessionJobs, QueueFull
+
+COORD_MAX_LENGTH = 10**9 # characters: large 3D COFs have tens of thousands of atoms
+MAX_DIAGNOSTICS = 20 # lines not parsed, to show
 
 pn.extension()
 
@@ -17,16 +30,34 @@ class CifParse():
     def __init__(self):
         self.name_input = pn.widgets.TextInput(name='COF name', placeholder='Insert...')
         self.cell_input = pn.widgets.TextInput(name='Cell info', placeholder='a = b = 37.2145 37.2145 Å , c = 4.0878 Å, α = β = 90° 90 and γ = 120°')
-        self.symm_input = pn.widgets.TextInput(name='Symm info', placeholder='P6 (check the table on the bottom)')
+        self.symm_input = pn.widgets.TextInput(name='Symm info', placeholder='P6, P 21/c, or IT number as 14')
+        self.symm_suggestions = pn.widgets.StaticText(name='Space group', value='')
+        # update the suggestions while typing, if this version of panel allows it
+        self.symm_input.param.watch(self.on_symm_change,
+                                    'value_input' if 'value_input' in self.symm_input.param else 'value')
         self.coord_input = pn.widgets.input.TextAreaInput(
             name='Atomic coord. info', 
             placeholder='Enter a string here...', 
-            max_length=100000,
+            max_length=COORD_MAX_LENGTH,
             height=800,
             )
+        self.diagnostics = pn.widgets.StaticText(name='Lines not parsed', value='')
+        self.timing = pn.widgets.StaticText(name='Timing', value='')
         self.find = pn.widgets.TextInput(name='Find', placeholder='RegEx to find...')
         self.replace = pn.widgets.TextInput(name='Replace', placeholder='Text to replace...')
-        self.replace_bak = []
+        self.history = EditHistory() # compact diffs of the last replaces, to undo them
+
+        # sections of the last CIF built, to regenerate only the ones changed by the next parse
+        self.coordinates = IncrementalParser()
+        self.coord_rows = [] # CIF row of each atom
+        self.header_inputs = None # (cell, symmetry) inputs of the header
+        self.header = None
+        self.written = None # (filename, CIF) written last
+        self.cif_text = None # CIF read in self.atoms
+        self.atoms = None
+        self.script = None # shown in the viewer
+        self.jobs = SessionJobs() # the CIF is read in the worker processes
+        self.jobs.btn_cancel.on_click(self.on_click_cancel)
         self.textbox = pn.widgets.input.TextAreaInput(
             name='Output CIF', 
             placeholder='Output CIF will be shown here...', 
@@ -45,9 +76,6 @@ class CifParse():
         self.jsmol_script_source = bmd.ColumnDataSource()
         self.applet = structure_jsmol(self.jsmol_script_source)
 
-        space_groups_csv = Path(__file__).parent / "space_groups.csv"
-        space_groups_df = pd.read_csv(space_groups_csv, index_col="_space_group_IT_number")
-        self.space_groups_table = pn.widgets.DataFrame(space_groups_df, autosize_mode='fit_viewport')
         
     def servable(self):
         """Layout of the CIF section of the page."""
@@ -56,6 +84,7 @@ class CifParse():
             self.name_input,
             self.cell_input,
             self.symm_input,
+            self.symm_suggestions,
             self.coord_input,
             pn.Row(
                 self.find,
@@ -66,24 +95,20 @@ class CifParse():
                 )
             ),
             self.btn_parse,
+            pn.Row(self.jobs.status, self.jobs.btn_cancel),
+            self.diagnostics,
+            self.timing,
             pn.pane.Bokeh(self.applet),
             self.textbox,
-            pn.pane.HTML("""<h2>Space Groups lookup table</h2>"""),
-            self.space_groups_table,
 
             width=1000
         )
         return self.column.servable()
 
-    def display(self, cif_str):
-        """Update applet to show CIF."""
-        from structure import structure_jsmol
-
-        self.jsmol_script_source.data['script'] = [
-"""load data "cifstring"
-{}
-end "cifstring"
-""".format(str(cif_str))]
+    def display(self, script):
+        """Update applet to show the structure, unless it is already shown."""
+        if script != self.jsmol_script_source.data.get('script', [None])[0]:
+            self.jsmol_script_source.data['script'] = [script]
         
     def parse_cell_input(self):
         """Try first to understand a string like:
@@ -116,100 +141,139 @@ end "cifstring"
                 self.cif_dict[celldim] = float(data[i])
 
     def read_and_check_symm(self, symm_input):
-        """Check if the input symmetry (_space_group_name_H-M_alt convention) starts with a correct character,
-        and convert the string to upper/lower case to help ASE for its parsing.
+        """Check if the input symmetry is a known space group (H-M symbol, in any common notation, or IT number),
+        and return its _space_group_name_H-M_alt symbol, as ASE expects it.
         """
-        first_char_list = {'A', 'C', 'F', 'I', 'P', 'R'}
-        first_char_inp = symm_input.strip()[0].upper()
-        other_char_inp = symm_input.strip()[1:].lower()
-        if first_char_inp not in first_char_list:
-            raise ValueError(f"No space group starts with '{first_char_inp}': check the table at the bottom!")
-        return first_char_inp + other_char_inp
+        found = lookup(symm_input)
+        if found is None:
+            raise ValueError(f"Unknown space group '{symm_input}': did you mean {', '.join(suggest(symm_input))}?")
+        return found[1]
+
+    def on_symm_change(self, event):
+        """Show the space group recognized, or the closest ones."""
+        if not event.new.strip():
+            self.symm_suggestions.value = ''
+            return
+        found = lookup(event.new)
+        if found:
+            self.symm_suggestions.value = f"{found[1]} (#{found[0]})"
+        else:
+            self.symm_suggestions.value = "Unknown, did you mean: " + ", ".join(suggest(event.new))
 
     def on_click_replace(self, event):
-        text_initial = self.coord_input.value
-        self.replace_bak.append(text_initial)
-        text_replaced = re.sub(self.find.value,self.replace.value,text_initial,flags=re.MULTILINE)
-        self.coord_input.value = text_replaced
+        self.coord_input.value = self.history.replace(self.coord_input.value, self.find.value, self.replace.value)
 
     def on_click_undo(self, event):
-        if len(self.replace_bak)==0:
-            raise ValueError("No replaced text backup to load!")
-        self.coord_input.value = self.replace_bak.pop()
+        self.coord_input.value = self.history.undo(self.coord_input.value)
+
+    def build_header(self):
+        """Section of the CIF before the coordinates: cell, symmetry and header of the loop."""
+        ofile = StringIO()
+        print("data_crystal", file=ofile)
+        print(" ", file=ofile)
+        print("_cell_length_a    %.5f" % self.cif_dict['a'], file=ofile)
+        print("_cell_length_b    %.5f" % self.cif_dict['b'], file=ofile)
+        print("_cell_length_c    %.5f" % self.cif_dict['c'], file=ofile)
+        print("_cell_angle_alpha %.5f" % self.cif_dict['α'], file=ofile)
+        print("_cell_angle_beta  %.5f" % self.cif_dict['β'], file=ofile)
+        print("_cell_angle_gamma %.5f" % self.cif_dict['γ'], file=ofile)
+        print(" ", file=ofile)
+        print(f"_symmetry_space_group_name_H-M  '{self.cif_dict['symm']}'", file=ofile)
+        print(" ", file=ofile)
+        print("loop_", file=ofile)
+        print("_atom_site_label", file=ofile)
+        #print("_atom_site_type_symbol", file=ofile)
+        print("_atom_site_fract_x", file=ofile)
+        print("_atom_site_fract_y", file=ofile)
+        print("_atom_site_fract_z", file=ofile)
+        return ofile.getvalue()
 
     def on_click_parse(self, event):
-        self.cif_dict = {} # Reset to avoid problems
-        self.parse_cell_input() 
-
-        self.cif_dict['symm'] = self.read_and_check_symm(self.symm_input.value)
-
-        self.cif_dict['coord'] = []
-
-        for line in self.coord_input.value.splitlines():
-            ncols = len(line.split())
-            if ncols==0 or ncols==1: # likely: \n or page number
-                continue
-            elif ncols==4: # likely: "atom_type x y z"
-                d = line.split()
-                newline = f'{d[0]} {d[1]} {d[2]} {d[3].split("S")[0]}' # remove the Sxx page index if present
-                self.cif_dict['coord'].append(newline)
-            elif ncols==5: # likely: "atom_type element x y z"
-                d = line.split()
-                newline = f'{d[0]} {d[2]} {d[3]} {d[4].split("S")[0]}'
-                self.cif_dict['coord'].append(newline)
-            elif ncols==8: # likely: double column "atom1 x1 y1 z1 atom2 x2 y2 z2"
-                d = line.split()
-                newline1 = f'{d[0]} {d[1]} {d[2]} {d[3]}'
-                newline2 = f'{d[4]} {d[5]} {d[6]} {d[7].split("S")[0]}'
-                self.cif_dict['coord'].append(newline1)
-                self.cif_dict['coord'].append(newline2)
-            else:
-                raise ValueError(f"Unable to parse line: '{line}'")
-
-        filename = Path(__file__).parent.parent / "cifs" / (self.name_input.value.strip() + ".cif")
-        with open(filename, 'w') as ofile:
-            print()
-
-            print("data_crystal", file=ofile)
-            print(" ", file=ofile)
-            print("_cell_length_a    %.5f" % self.cif_dict['a'], file=ofile)
-            print("_cell_length_b    %.5f" % self.cif_dict['b'], file=ofile)
-            print("_cell_length_c    %.5f" % self.cif_dict['c'], file=ofile)
-            print("_cell_angle_alpha %.5f" % self.cif_dict['α'], file=ofile)
-            print("_cell_angle_beta  %.5f" % self.cif_dict['β'], file=ofile)
-            print("_cell_angle_gamma %.5f" % self.cif_dict['γ'], file=ofile)
-            print(" ", file=ofile)
-            print(f"_symmetry_space_group_name_H-M  '{self.cif_dict['symm']}'", file=ofile)
-            print(" ", file=ofile)
-            print("loop_", file=ofile)
-            print("_atom_site_label", file=ofile)
-            #print("_atom_site_type_symbol", file=ofile)
-            print("_atom_site_fract_x", file=ofile)
-            print("_atom_site_fract_y", file=ofile)
-            print("_atom_site_fract_z", file=ofile)
-            for line in self.cif_dict['coord']:
-                print(line, file=ofile)
-
-        self.textbox.value = open(filename, 'r').read()
-
-        print ('Printed CIF file:', filename)
-
-        from ase.io import read, write
-        from ase.io.cif import write_cif
-        from ase.geometry.dimensionality import analyze_dimensionality
-        from ase.build import make_supercell
-
-        atoms = read(filename, format='cif') # need to load to unwrap?
-
-        import tempfile
-        with tempfile.TemporaryFile() as handle:
-            write(handle, atoms, format='cif')
-            handle.seek(0)
-            self.cif_str = handle.read()
-
-        self.display(self.cif_str.decode())
+        """Build the CIF, write it to the cifs/ folder and display it: only the sections changed since the last
+        parse are regenerated (cell and symmetry, rows of the lines of coordinates edited), and the CIF is written
+        and read again only if it changed, in a worker process (see on_read_done).
+        """
+        from functools import partial
+
+        timer = Timer('CifParse.on_click_parse', cof_name=self.name_input.value.strip())
+        try:
+            with timer:
+                with timer.stage('parse_cell_and_symm') as info:
+                    inputs = (self.cell_input.value, self.symm_input.value)
+                    info['changed'] = inputs != self.header_inputs
+                    if info['changed']:
+                        self.cif_dict = {} # Reset to avoid problems
+                        self.parse_cell_input()
+                        self.cif_dict['symm'] = self.read_and_check_symm(self.symm_input.value)
+                        self.header, self.header_inputs = self.build_header(), inputs
+
+                with timer.stage('parse_coordinates', chars=len(self.coord_input.value)) as info:
+                    labels, xyz, diagnostics = self.coordinates.parse(self.coord_input.value)
+                    start, old_stop, new_stop = self.coordinates.changed
+                    self.coord_rows[start:old_stop] = [f'{label} {x:.6f} {y:.6f} {z:.6f}\n' for label, (x, y, z)
+                                                       in zip(labels[start:new_stop], xyz[start:new_stop])]
+                    info.update(atoms=len(labels), changed=new_stop - start, bad_lines=len(diagnostics))
+                self.diagnostics.value = "<br>".join(
+                    f"line {number}: {reason}: '{line}'" for number, line, reason in diagnostics[:MAX_DIAGNOSTICS])
+                if len(diagnostics) > MAX_DIAGNOSTICS:
+                    self.diagnostics.value += f"<br>... and other {len(diagnostics) - MAX_DIAGNOSTICS} lines"
+                if len(labels) == 0:
+                    raise ValueError("No atomic coordinates found: check the lines not parsed!")
+
+                with timer.stage('build_cif') as info:
+                    cif_text = self.header + ''.join(self.coord_rows)
+                    info['chars'] = len(cif_text)
+
+                # print it to the cifs/ folder, unless it was just done
+                with timer.stage('write_file') as info:
+                    filename = Path(__file__).parent.parent / "cifs" / (self.name_input.value.strip() + ".cif")
+                    info['skipped'] = (filename, cif_text) == self.written
+                    if not info['skipped']:
+                        with open(filename, 'w') as handle:
+                            handle.write(cif_text)
+                        self.written = (filename, cif_text)
+                        print ('Printed CIF file:', filename)
+                self.textbox.value = cif_text
+
+                # unwrap the symmetry in a worker, not to block the other sessions, unless it was just done
+                if cif_text == self.cif_text:
+                    with timer.stage('display', read_cif='skipped'):
+                        self.display(self.script)
+                    return
+                self.btn_parse.button_type = 'warning'
+                done_timer = Timer('CifParse.on_read_done', cof_name=self.name_input.value.strip())
+                try:
+                    self.jobs.submit('read_cif', partial(self.on_read_done, cif_text=cif_text, timer=done_timer),
+                                     read_structure, cif_text)
+                except QueueFull:
+                    self.btn_parse.button_type = 'danger'
+                    raise
+        finally:
+            self.timing.value = timer.summary('<br>')
+
+    def on_click_cancel(self, event):
+        """Turn the button primary again: the jobs of the session are cancelled by SessionJobs."""
+        self.btn_parse.button_type = 'primary'
+
+    def on_read_done(self, job, cif_text, timer):
+        """Display the structure read from the CIF: the asymmetric unit, letting JSmol apply the symmetry,
+        unless too large to unwrap client-side.
+        """
+        self.btn_parse.button_type = 'danger' if job.status == 'failed' else 'primary'
+        try:
+            with timer:
+                job.add_timing(timer)
+                self.atoms, self.script = job.result()
+                self.cif_text = cif_text
+                timer.info['atoms'] = len(self.atoms)
+                with timer.stage('display', chars=len(self.script)):
+                    self.display(self.script)
+        finally:
+            self.timing.value = timer.summary('<br>')
 
         
 
 cif = CifParse()
 cif.servable()
+
+report_session('parse_cif', SESSION_START)
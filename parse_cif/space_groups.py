@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""Index of the space groups (from space_groups.csv), built once per server process:
+lookup by Hermann-Mauguin symbol, written in any common way, or by IT number, with suggestions for typos.
+"""
+
+import csv
+import difflib
+from pathlib import Path
+
+SPACE_GROUPS_CSV = Path(__file__).parent / "space_groups.csv"
+
+def normalize(symbol):
+    """Key of a H-M symbol: no spaces, lower case, no origin/axes choice, no '1' of the full monoclinic symbols.
+    E.g., 'P 1 21/c 1', 'P21/c' and 'p 21/C' all give 'p21/c'.
+    """
+    symbol = symbol.strip().replace('−', '-').replace('_', ' ').split(':')[0]
+    tokens = symbol.split()
+    if len(tokens) == 4 and tokens[1] == tokens[3] == '1': # e.g., P 1 21/c 1
+        tokens = [tokens[0], tokens[2]]
+    return ''.join(tokens).lower()
+
+def _load():
+    symbols, numbers = {}, {}
+    with open(SPACE_GROUPS_CSV) as handle:
+        for row in csv.DictReader(handle):
+            number, symbol = int(row['_space_group_IT_number']), row['_space_group_name_H-M_alt']
+            symbols.setdefault(normalize(symbol), (number, symbol))
+            numbers.setdefault(number, symbol) # first setting, as listed in the table
+    return symbols, numbers
+
+SYMBOLS, NUMBERS = _load() # normalized symbol -> (IT number, H-M symbol), IT number -> H-M symbol
+
+def lookup(text):
+    """Return (IT number, H-M symbol) for a symbol or an IT number (e.g., '14' or '#14'), or None."""
+    text = text.strip().lstrip('#')
+    if text.isdigit():
+        number = int(text)
+        return (number, NUMBERS[number]) if number in NUMBERS else None
+    return SYMBOLS.get(normalize(text))
+
+def suggest(text, n=5):
+    """Closest space groups to the text, as strings like 'P 21/c (#14)'."""
+    found = lookup(text)
+    if found:
+        return ["{} (#{})".format(found[1], found[0])]
+    keys = difflib.get_close_matches(normalize(text), SYMBOLS, n=n, cutoff=0.5)
+    return ["{} (#{})".format(SYMBOLS[key][1], SYMBOLS[key][0]) for key in keys]
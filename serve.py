@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""Serve the Bokeh apps, with JSmol served from local files (if present) instead of the remote site.
+
+Usage example:
+    python serve.py cofdb_submit parse_cif --port 5006
+
+Download JSmol (e.g., the jsmol/ folder of the Jmol distribution, https://sourceforge.net/projects/jmol/)
+to the jsmol/ folder of this repository, or set JSMOL_DIR to its path.
+The files are served at /jsmol with long-lived cache headers, so the browsers download them only once.
+"""
+
+import os
+import argparse
+from tornado.web import StaticFileHandler
+
+JSMOL_DIR = os.environ.get('JSMOL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'jsmol'))
+JSMOL_ROUTE = '/jsmol'
+CACHE_SECONDS = 7 * 24 * 3600
+# the uploads are sent base64-encoded through the websocket: larger messages than the largest CIF accepted by the
+# apps (plus the envelope of the message) are refused by the server, before reading them
+MAX_UPLOAD_MB = float(os.environ.get('COFDB_MAX_UPLOAD_MB', 100))
+WEBSOCKET_MAX_BYTES = int(MAX_UPLOAD_MB * 1024**2 * 4 / 3) + 1024**2
+
+class CachedStaticFileHandler(StaticFileHandler):
+    """Static files with a long cache time, also when requested without the ?v= version argument
+    (JSmol requests its j2s files by itself)."""
+
+    def get_cache_time(self, path, modified, mime_type):
+        return CACHE_SECONDS
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('apps', nargs='+', help='folders of the Bokeh apps')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5006)))
+    parser.add_argument('--allow-websocket-origin', action='append', default=None,
+                        help='host[:port] allowed to connect (can be repeated)')
+    parser.add_argument('--remote-jsmol', action='store_true', help='use the remote JSmol also if the files are present')
+    args = parser.parse_args(argv)
+
+    extra_patterns = []
+    if not args.remote_jsmol and os.path.isfile(os.path.join(JSMOL_DIR, 'JSmol.min.js')):
+        print("Serving JSmol from {} at {}".format(JSMOL_DIR, JSMOL_ROUTE))
+        os.environ['JSMOL_URL'] = JSMOL_ROUTE # read by structure.py, when the apps are loaded below
+        extra_patterns.append((JSMOL_ROUTE + '/(.*)', CachedStaticFileHandler, {'path': JSMOL_DIR}))
+    else:
+        print("Using the remote JSmol")
+
+    from bokeh.command.util import build_single_handler_applications
+    from bokeh.server.server import Server
+
+    applications = build_single_handler_applications(args.apps)
+    origins = args.allow_websocket_origin or ['localhost:{}'.format(args.port)]
+    server = Server(applications, port=args.port, allow_websocket_origin=origins, extra_patterns=extra_patterns,
+                    websocket_max_message_size=WEBSOCKET_MAX_BYTES)
+    server.start()
+    print("Bokeh apps running at: {}".format(", ".join(
+        'http://localhost:{}{}'.format(args.port, route) for route in applications)))
+    server.io_loop.start()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+"""Run the tests on synthetic tables and CIF files (see benchmarks/fixtures.py): python -m pytest tests"""
+
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix='cofdb_tests_')
+# read by data.py when imported: never the real CURATED-COFs folder or cache
+os.environ['CURATED_COFS'] = os.path.join(WORKDIR, 'CURATED-COFs')
+os.environ['COFDB_CACHE'] = os.path.join(WORKDIR, 'cache')
+for folder in ('benchmarks', 'parse_cif', 'cofdb_submit'): # the modules are imported as the apps do
+    sys.path.insert(0, os.path.join(ROOT, folder))
+
+@pytest.fixture
+def tables():
+    """New cof-papers.csv (papers p0000-p0009) and cof-frameworks.csv (100 frameworks), with the ID index reset."""
+    from fixtures import write_tables
+    from data import CURATED_COFS
+    from ids import ID_INDEX
+
+    write_tables(CURATED_COFS, 100)
+    ID_INDEX.reset()
+    yield CURATED_COFS
+    ID_INDEX.reset()
@@ -0,0 +1,57 @@
+import pytest
+from data import FRAMEWORKS_FILE, PAPERS_FILE
+from ids import ID_INDEX
+from snapshot import SNAPSHOT
+
+def test_mint_cof_id(tables):
+    assert ID_INDEX.mint_cof_id('p0003', 'N', '2') == '000310N2' # 10 frameworks of p0003 in the table
+    assert ID_INDEX.mint_cof_id('p0003', 'N', '2') == '000310N2' # not reserved
+    assert ID_INDEX.mint_cof_id('p0003', 'C', '3', reserve=True) == '000310C3'
+    assert ID_INDEX.mint_cof_id('p0003', 'N', '2') == '000311N2'
+
+def test_mint_cof_id_skips_taken_ids(tables):
+    ID_INDEX.add_framework('000310N2', 'p0004') # e.g., a row edited by hand
+    assert ID_INDEX.mint_cof_id('p0003', 'N', '2') == '000311N2'
+
+def test_mint_paper_id(tables):
+    assert ID_INDEX.mint_paper_id('10.0000/synthetic.3', '2000') == 'p0003 (already present)'
+    assert ID_INDEX.mint_paper_id('10.0000/new', '2000') == 'p0010'
+    assert ID_INDEX.mint_paper_id('10.0000/new', '2021') == 'p2100'
+    ID_INDEX.paper_counter['30'] = 99
+    assert ID_INDEX.mint_paper_id('10.0000/new', '2030').startswith('ERROR')
+
+def test_paper_of_framework(tables):
+    ID_INDEX.update()
+    assert ID_INDEX.paper_of_framework('00031N2') == 'p0003'
+    assert ID_INDEX.paper_of_framework('000312C3') == 'p0003'
+    with pytest.raises(ValueError):
+        ID_INDEX.paper_of_framework('09991N2') # unknown paper
+    with pytest.raises(ValueError):
+        ID_INDEX.paper_of_framework('p0003')
+
+def test_transaction_appends(tables):
+    with ID_INDEX.transaction(FRAMEWORKS_FILE) as rows:
+        cof_id = ID_INDEX.mint_cof_id('p0001', 'N', '2', reserve=True)
+        rows.append([cof_id, 'SI (CIF)', 'COF-new', 'C', 'none'])
+    assert SNAPSHOT.framework(cof_id) is not None
+    ID_INDEX.reset() # rebuilt from the CSV file
+    assert ID_INDEX.has_framework(cof_id)
+    assert ID_INDEX.mint_cof_id('p0001', 'N', '2') == '000111N2'
+
+def test_transaction_rollback(tables):
+    count = SNAPSHOT.count(FRAMEWORKS_FILE)
+    with pytest.raises(RuntimeError):
+        with ID_INDEX.transaction(FRAMEWORKS_FILE) as rows:
+            cof_id = ID_INDEX.mint_cof_id('p0001', 'N', '2', reserve=True)
+            rows.append([cof_id, 'SI (CIF)', 'COF-new', 'C', 'none'])
+            raise RuntimeError("failed after minting")
+    assert SNAPSHOT.count(FRAMEWORKS_FILE) == count # nothing written
+    assert not ID_INDEX.has_framework(cof_id) # the reserved ID is forgotten
+    assert ID_INDEX.mint_cof_id('p0001', 'N', '2') == cof_id
+
+def test_transaction_of_papers(tables):
+    with ID_INDEX.transaction(PAPERS_FILE) as rows:
+        paper_id = ID_INDEX.mint_paper_id('10.0000/new', '2000', reserve=True)
+        rows.append([paper_id, 'J. Synth., 2000, 1, 1', '10.0000/new', 'New paper'])
+    ID_INDEX.reset()
+    assert ID_INDEX.paper_of_doi('10.0000/new') == 'p0010'
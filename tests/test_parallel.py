@@ -0,0 +1,32 @@
+import os
+import time
+from parallel import imap_ordered
+
+def work(seconds, value):
+    """Task of the workers: sleep, then return the value (or raise it, or kill the worker)."""
+    time.sleep(seconds)
+    if value == 'kill':
+        os._exit(9)
+    if isinstance(value, Exception):
+        raise value
+    return value
+
+def test_order():
+    tasks = [(0.2 if i % 3 == 0 else 0, i) for i in range(10)] # later tasks may complete first
+    results = list(imap_ordered(work, iter(tasks), workers=3))
+    assert [args for args, _, _ in results] == tasks
+    assert [result for _, result, _ in results] == list(range(10))
+
+def test_errors():
+    results = list(imap_ordered(work, [(0, ValueError('bad')), (0, 'kill'), (0, 'ok')], workers=2))
+    assert isinstance(results[0][2], ValueError)
+    assert isinstance(results[1][2], RuntimeError) # the worker died: it is replaced
+    assert results[2][1:] == ('ok', None)
+
+def test_timeout():
+    tasks = [(30, 'stuck')] + [(0.1, i) for i in range(10)]
+    start = time.monotonic()
+    results = list(imap_ordered(work, tasks, workers=2, timeout=1))
+    assert time.monotonic() - start < 10 # the stuck worker is terminated
+    assert isinstance(results[0][2], TimeoutError)
+    assert [result for _, result, _ in results[1:]] == list(range(10))
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from coords import parse_coordinates, IncrementalParser
+from edits import EditHistory
+from space_groups import lookup, suggest
+
+TEXT = """C1 0.1234(5) 0.5 0.25
+S12
+H1 H 0.1 0.2 0.3
+C2 0.1 0.2 0.3 C3 0.4 0.5 0.6
+
+N1 0.1 abc 0.3
+O1 0.1 0.2
+"""
+
+def test_parse_coordinates():
+    labels, xyz, diagnostics = parse_coordinates(TEXT)
+    assert labels.tolist() == ['C1', 'H1', 'C2', 'C3']
+    assert np.allclose(xyz[0], [0.1234, 0.5, 0.25]) # without the uncertainty
+    assert [(number, reason) for number, _, reason in diagnostics] == [
+        (6, "coordinates are not numbers"), (7, "unexpected number of columns (3)")]
+
+@pytest.mark.parametrize('edit', [
+    lambda lines: lines[:2] + ['X9 0.9 0.9 0.9'] + lines[3:], # replace a line
+    lambda lines: lines[:1] + lines[2:],                      # delete a line
+    lambda lines: lines + ['Y1 0.7 0.7 0.7', 'bad line here'],  # append
+    lambda lines: ['Z1 0 0 0'] + lines,                       # insert at the top
+])
+def test_incremental_parser(edit):
+    parser = IncrementalParser()
+    parser.parse(TEXT)
+    text = '\n'.join(edit(TEXT.splitlines()))
+    labels, xyz, diagnostics = parser.parse(text)
+    expected = parse_coordinates(text)
+    assert labels.tolist() == expected[0].tolist()
+    assert np.allclose(xyz, expected[1])
+    assert diagnostics == expected[2]
+
+def test_edit_history_undo():
+    history = EditHistory()
+    text = "C1 0.1 0.2 0.3\nC2 0.4 0.5 0.6\n"
+    first = history.replace(text, r'^C', 'N')
+    second = history.replace(first, r'0\.(\d)', r'0.\g<1>0')
+    assert second == "N1 0.10 0.20 0.30\nN2 0.40 0.50 0.60\n"
+    assert history.undo(second) == first
+    assert history.undo(first) == text
+    with pytest.raises(ValueError):
+        history.undo(text) # nothing left
+
+def test_edit_history_after_manual_edit():
+    history = EditHistory()
+    text = history.replace("C1 0.1 0.2 0.3\n", r'C', 'N')
+    with pytest.raises(ValueError):
+        history.undo(text + "edited by hand\n")
+    assert len(history) == 0
+
+def test_edit_history_depth():
+    history = EditHistory(depth=2)
+    text = "a"
+    for letter in "bcd":
+        text = history.replace(text, '.', letter)
+    assert len(history) == 2
+    assert history.undo(history.undo(text)) == "b"
+
+@pytest.mark.parametrize('text', ['P21/c', 'P 1 21/c 1', 'p 21/C', '14', '#14'])
+def test_lookup(text):
+    assert lookup(text)[0] == 14
+
+def test_lookup_unknown():
+    assert lookup('P 99/z') is None
+    assert lookup('999') is None
+    assert any('(#14)' in found for found in suggest('P21/d'))
@@ -0,0 +1,49 @@
+import pytest
+from fixtures import write_tables
+from snapshot import Snapshot
+
+@pytest.fixture
+def frameworks(tmp_path):
+    """Snapshot of a new cof-frameworks.csv with 100 rows: return it with the path of the CSV file."""
+    write_tables(str(tmp_path), 100)
+    csv_path = str(tmp_path / 'cof-frameworks.csv')
+    snapshot = Snapshot(str(tmp_path / 'snapshot.sqlite'), {csv_path: 'frameworks'})
+    assert snapshot.count(csv_path) == 100
+    return snapshot, csv_path
+
+def append(csv_path, text):
+    with open(csv_path, 'a') as handle:
+        handle.write(text)
+
+def test_append_is_incremental(frameworks):
+    snapshot, csv_path = frameworks
+    generation = snapshot.generation(csv_path)
+    append(csv_path, '"99990N2","SI","new","C","none"\n')
+    assert snapshot.count(csv_path) == 101
+    assert snapshot.generation(csv_path) == generation # not loaded again
+    assert snapshot.rows(csv_path, ['cof_id', 'name'], start=100) == [('99990N2', 'new')]
+
+def test_incomplete_line_waits(frameworks):
+    snapshot, csv_path = frameworks
+    append(csv_path, '"99990N2","SI","new"') # being written by another process
+    assert snapshot.count(csv_path) == 100
+    append(csv_path, ',"C","none"\n')
+    assert snapshot.rows(csv_path, ['cof_id', 'elements'], start=100) == [('99990N2', 'C')]
+
+def test_edit_in_place_reloads(frameworks):
+    snapshot, csv_path = frameworks
+    generation = snapshot.generation(csv_path)
+    with open(csv_path) as handle:
+        text = handle.read()
+    with open(csv_path, 'r+') as handle: # same size, same inode: only the content tells
+        handle.write(text.replace('COF-1"', 'COF-X"', 1))
+    assert snapshot.generation(csv_path) == generation + 1
+    assert ('COF-X',) in snapshot.rows(csv_path, ['name'])
+    assert snapshot.count(csv_path) == 100
+
+def test_rewritten_file_reloads(frameworks, tmp_path):
+    snapshot, csv_path = frameworks
+    generation = snapshot.generation(csv_path)
+    write_tables(str(tmp_path), 50) # new file, as after a git checkout
+    assert snapshot.count(csv_path) == 50
+    assert snapshot.generation(csv_path) == generation + 1
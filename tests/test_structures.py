@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from fixtures import layered_atoms, bulk_atoms
+from dimensionality import classify_dimensionality
+from transforms import permute_axes, replicate_cell
+
+@pytest.mark.parametrize('relabel, normal', [(None, 2), ('bca', 1), ('cab', 0)])
+def test_classify_layers(relabel, normal):
+    atoms = layered_atoms(64)
+    if relabel:
+        permute_axes(atoms, relabel)
+    result = classify_dimensionality(atoms)
+    assert (result['dimtype'], result['method'], result['normal']) == ('2D', 'fast', normal)
+    if normal != 2: # the relabel suggested brings the layers back on the ab plane
+        permute_axes(atoms, result['relabel'])
+        assert classify_dimensionality(atoms)['normal'] == 2
+
+@pytest.mark.parametrize('make_atoms, dimtype', [(layered_atoms, '2D'), (bulk_atoms, '3D')])
+def test_classify_as_rda(make_atoms, dimtype):
+    from ase.geometry.dimensionality import analyze_dimensionality
+
+    atoms = make_atoms(64)
+    assert classify_dimensionality(atoms)['dimtype'] == dimtype
+    assert analyze_dimensionality(atoms, method='RDA')[0].dimtype == dimtype
+
+def test_permute_axes_keeps_positions():
+    atoms = layered_atoms(64)
+    positions, cell = atoms.get_positions(), np.array(atoms.cell)
+    permute_axes(atoms, 'cab')
+    assert np.allclose(atoms.get_positions(), positions)
+    assert np.allclose(atoms.cell, cell[[2, 0, 1]])
+    with pytest.raises(ValueError):
+        permute_axes(atoms, 'acb') # would mirror the structure
+
+@pytest.mark.parametrize('reps', [(1, 1, 2), (2, 3, 1)])
+def test_replicate_cell_as_ase(reps):
+    from ase.build import make_supercell
+
+    atoms = bulk_atoms(8)
+    atoms.set_initial_charges(np.arange(len(atoms))) # also the other arrays are tiled
+    expected = make_supercell(atoms, np.diag(reps))
+    supercell = replicate_cell(atoms, reps)
+    assert np.allclose(supercell.cell, expected.cell)
+    assert np.allclose(supercell.get_positions(), expected.get_positions())
+    assert np.array_equal(supercell.numbers, expected.numbers)
+    assert np.array_equal(supercell.get_initial_charges(), expected.get_initial_charges())